@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import partitions
+from .crud import CLOSED_STATUSES
+from .config import settings
+from .db import ARCHIVE_LOCK_ID, engine
+from .models import Lead, LeadArchive, LeadAttachment, LeadIdempotencyKey
+
+log = logging.getLogger(__name__)
+
+# Архив заявок. Закрытые (done/rejected) заявки старше ARCHIVE_AFTER_DAYS
+# переносятся из leads в leads_archive пачками: строка заявки + её вложения
+# JSON-списком, одна транзакция на пачку. Свёртка lead_stats_daily не меняется —
+# в статистике архивные заявки остаются. Выгрузка архива — те же
+# /api/admin/export/leads.{csv,ndjson} с ?archived=1.
+#
+# Тот же проход заранее создаёт месячные секции (partitions.ensure_partitions)
+# и чистит старые ключи идемпотентности. Работает фоном в API
+# (ARCHIVE_WORKER=1) или разово из cron:
+#   python -m app.archive             секции + архив до конца + ключи
+
+# из вложения в архив идёт только то, что нужно для показа и повторной загрузки
+ARCHIVED_ATTACHMENT_FIELDS = (
+    "id", "file_id", "file_type", "file_unique_id", "width", "height", "file_size", "sizes", "thumb_sha256",
+)
+
+class LeadArchiver:
+    def __init__(
+        self,
+        after_days: int,
+        batch_size: int = 500,
+        interval: float = 3600.0,
+        key_ttl_days: int = 30,
+    ):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.key_ttl_days = key_ttl_days
+        self._task: Optional[asyncio.Task] = None
+        self.archived = 0
+        self.partitions_created = 0
+        self.keys_purged = 0
+
+    async def _locked(self, conn: AsyncConnection) -> bool:
+        if conn.dialect.name != "postgresql":
+            return True
+        return bool(await conn.scalar(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": ARCHIVE_LOCK_ID}))
+
+    async def _archive_batch(self, conn: AsyncConnection, cutoff: datetime) -> int:
+        stmt = (
+            select(Lead.__table__)
+            .where(Lead.status.in_(CLOSED_STATUSES), Lead.created_at < cutoff)
+            .order_by(Lead.created_at, Lead.id)
+            .limit(self.batch_size)
+        )
+        leads = (await conn.execute(stmt)).mappings().all()
+        if not leads:
+            return 0
+        ids = [lead["id"] for lead in leads]
+        # условие по lead_created_at/created_at оставляет Postgres только старые секции
+        res = await conn.execute(
+            select(*(LeadAttachment.__table__.c[f] for f in ARCHIVED_ATTACHMENT_FIELDS), LeadAttachment.lead_id)
+            .where(LeadAttachment.lead_id.in_(ids), LeadAttachment.lead_created_at < cutoff)
+            .order_by(LeadAttachment.id)
+        )
+        attachments: dict[int, list[dict]] = {}
+        for row in res.mappings():
+            attachments.setdefault(row["lead_id"], []).append({f: row[f] for f in ARCHIVED_ATTACHMENT_FIELDS})
+
+        now = datetime.utcnow()
+        columns = [c.name for c in LeadArchive.__table__.c if c.name not in ("attachments", "archived_at")]
+        rows = [
+            {**{c: lead[c] for c in columns}, "attachments": attachments.get(lead["id"]) or None, "archived_at": now}
+            for lead in leads
+        ]
+        self.partitions_created += len(
+            await partitions.ensure_archive_partitions(conn, {lead["created_at"].year for lead in leads}))
+        await conn.execute(insert(LeadArchive), rows)
+        await conn.execute(
+            delete(LeadAttachment).where(LeadAttachment.lead_id.in_(ids), LeadAttachment.lead_created_at < cutoff)
+        )
+        await conn.execute(delete(Lead).where(Lead.id.in_(ids), Lead.created_at < cutoff))
+        return len(rows)
+
+    async def run_once(self) -> int:
+        """Секции вперёд, одна пачка архива, старые ключи. Возвращает число перенесённых заявок."""
+        now = datetime.utcnow()
+        async with engine.begin() as conn:
+            # архиватор другого процесса уже делает проход — пропускаем свой
+            if not await self._locked(conn):
+                return 0
+            self.partitions_created += len(await partitions.ensure_partitions(conn, now))
+            moved = 0
+            if self.after_days > 0:
+                moved = await self._archive_batch(conn, now - timedelta(days=self.after_days))
+            if self.key_ttl_days > 0:
+                res = await conn.execute(
+                    delete(LeadIdempotencyKey).where(LeadIdempotencyKey.created_at < now - timedelta(days=self.key_ttl_days))
+                )
+                self.keys_purged += res.rowcount or 0
+        if moved:
+            log.info("archived %s leads", moved)
+        self.archived += moved
+        return moved
+
+    async def run_all(self) -> int:
+        total = 0
+        while True:
+            moved = await self.run_once()
+            total += moved
+            if moved < self.batch_size:
+                return total
+
+    def metrics(self) -> dict:
+        return {"archived": self.archived, "partitions_created": self.partitions_created, "keys_purged": self.keys_purged}
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                moved = await self.run_once()
+            except Exception:
+                log.exception("lead archiver crashed, restarting")
+                moved = 0
+            if moved < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+lead_archiver = LeadArchiver(
+    settings.archive_after_days,
+    batch_size=settings.archive_batch_size,
+    interval=settings.archive_interval,
+    key_ttl_days=settings.idempotency_key_ttl_days,
+)
+
+async def _main() -> int:
+    try:
+        moved = await lead_archiver.run_all()
+        print(f"archived {moved} leads, created {lead_archiver.partitions_created} partitions, "
+              f"purged {lead_archiver.keys_purged} idempotency keys")
+        return 0
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    argparse.ArgumentParser(prog="python -m app.archive", description="create partitions ahead and archive closed leads").parse_args()
+    sys.exit(asyncio.run(_main()))
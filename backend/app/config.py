@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
-from typing import List
+from functools import cached_property
+from typing import FrozenSet
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -16,20 +17,86 @@ class Settings(BaseSettings):
     postgres_host: str = "db"
     postgres_port: int = 5432
 
+    # пул соединений к основной базе (на процесс): размер, сверх него при пиках, ожидание свободного (сек);
+    # recycle — переоткрывать соединения старше N сек (-1 — нет); pre-ping — лишний SELECT 1 на каждую
+    # выдачу из пула, нужен, только если соединения рвутся по простою (NAT, PgBouncer с idle-таймаутом)
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = False
+    # кэш подготовленных запросов asyncpg на соединение (0 — для PgBouncer в transaction mode)
+    # и таймаут одного запроса (сек)
+    db_statement_cache_size: int = 100
+    db_command_timeout: float = 60.0
+
+    # чтение (контент, списки и поиск в админке, статистика, экспорт) идёт через отдельный пул:
+    # на реплику, если задан DB_REPLICA_URL (postgresql+asyncpg://...), иначе на основную базу —
+    # так тяжёлый экспорт не забирает соединения у приёма заявок
+    db_replica_url: str = ""
+    db_read_pool_size: int = 5
+    db_read_max_overflow: int = 5
+
+    # применять миграции и сид при старте API (для разработки; в проде — `python -m app.migrate`)
+    auto_migrate: bool = False
+
+    # webhook бота внутри API: "bot.app.webhook:asgi_app" (нужен корень репозитория в PYTHONPATH);
+    # адрес для setWebhook — PUBLIC_BASE_URL + BOT_WEBHOOK_PATH + "/"
+    bot_webhook_app: str = ""
+    bot_webhook_path: str = "/tg/webhook"
+
+    # initData: максимальный возраст по auth_date (0 — не проверять) и кэш проверенных строк
+    init_data_max_age: int = 86400
+    init_data_cache_size: int = 4096
+    init_data_cache_ttl: int = 300
+
+    # миниатюры фото из заявок: фоновая загрузка через Bot API в локальный кэш
+    # (content-addressed, вытеснение давно не читанных при превышении размера).
+    # Кэш у каждой реплики свой: вытесненный файл докачивает воркер той же реплики,
+    # так что на репликах, отдающих /api/thumbs, THUMB_WORKER должен быть включён
+    telegram_api_url: str = "https://api.telegram.org"
+    thumb_worker: bool = True
+    thumb_cache_dir: str = "thumb_cache"
+    thumb_cache_max_bytes: int = 200 * 1024 * 1024
+    thumb_min_side: int = 320
+
+    # заявки: в Postgres leads и lead_attachments секционированы по месяцам (partitions.py).
+    # Закрытые (done/rejected) заявки в списках, поиске и экспорте админки по умолчанию — только за
+    # последние LEAD_HOT_MONTHS месяцев, открытые — всегда (?history=1 — все; 0 — без окна). Архиватор раз в ARCHIVE_INTERVAL сек создаёт секции на
+    # PARTITION_MONTHS_AHEAD месяцев вперёд и переносит закрытые заявки старше ARCHIVE_AFTER_DAYS
+    # (0 — не переносить) в leads_archive; ключи идемпотентности живут IDEMPOTENCY_KEY_TTL_DAYS
+    lead_hot_months: int = 3
+    archive_worker: bool = True
+    archive_after_days: int = 180
+    archive_batch_size: int = 500
+    archive_interval: float = 3600.0
+    partition_months_ahead: int = 3
+    idempotency_key_ttl_days: int = 30
+
+    # GET /metrics (формат Prometheus): если задан токен — только с "Authorization: Bearer <токен>";
+    # GET /debug/profile?seconds=30 — сэмплирующий профайлер (свёрнутые стеки для flame graph), по умолчанию выключен
+    metrics_token: str = ""
+    profiler_enabled: bool = False
+
+    # полный URL SQLAlchemy вместо POSTGRES_* (например, sqlite+aiosqlite:///bench.sqlite3 в бенчмарках)
+    db_url: str = ""
+
     @property
     def database_url(self) -> str:
+        if self.db_url:
+            return self.db_url
         return (
             f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}"
             f"@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
 
-    @property
-    def admin_ids(self) -> List[int]:
-        ids = []
+    @cached_property
+    def admin_ids(self) -> FrozenSet[int]:
+        ids = set()
         for part in (self.admin_telegram_ids or "").split(","):
             part = part.strip()
             if part.isdigit():
-                ids.append(int(part))
-        return ids
+                ids.add(int(part))
+        return frozenset(ids)
 
 settings = Settings()
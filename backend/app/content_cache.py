@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+from .db import AsyncSessionLocal
+
+# Контент (FAQ / документы / проекты) меняется только при сидировании,
+# поэтому держим готовые JSON-байты в памяти и сбрасываем их по версии.
+
+@dataclass(frozen=True)
+class CachedContent:
+    version: int
+    body: bytes
+    etag: str
+
+async def _load_faq(session: AsyncSession) -> list[dict]:
+    items = await crud.get_faq(session)
+    return [{"id": i.id, "question": i.question, "answer": i.answer} for i in items]
+
+async def _load_documents(session: AsyncSession) -> list[dict]:
+    items = await crud.get_documents(session)
+    return [{"id": i.id, "title": i.title, "url": f"/site/{i.path}"} for i in items]
+
+async def _load_projects(session: AsyncSession) -> list[dict]:
+    items = await crud.get_projects(session)
+    return [{"id": i.id, "title": i.title, "description": i.description, "image": i.image} for i in items]
+
+LOADERS: dict[str, Callable[[AsyncSession], Awaitable[list[dict]]]] = {
+    "faq": _load_faq,
+    "documents": _load_documents,
+    "projects": _load_projects,
+}
+
+def _serialize(items: list[dict]) -> bytes:
+    return orjson.dumps(items)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+class ContentCache:
+    def __init__(self):
+        self._version = 0
+        self._entries: dict[str, CachedContent] = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self) -> None:
+        # вызывать после любого коммита, меняющего faq/documents/projects
+        self._version += 1
+        self._entries.clear()
+
+    async def get(self, name: str) -> CachedContent:
+        entry = self._entries.get(name)
+        if entry is not None and entry.version == self._version:
+            return entry
+        async with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.version == self._version:
+                return entry
+            version = self._version
+            # с основной базы, не с реплики: загружается раз на процесс сразу после
+            # миграции, отстающая реплика закэшировала бы старый контент до рестарта
+            async with AsyncSessionLocal() as session:
+                items = await LOADERS[name](session)
+            body = _serialize(items)
+            entry = CachedContent(
+                version=version,
+                body=body,
+                etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            )
+            # если пока грузили случился invalidate — не кладём устаревшее
+            if version == self._version:
+                self._entries[name] = entry
+            return entry
+
+content_cache = ContentCache()
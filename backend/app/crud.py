@@ -1,53 +1,382 @@
-from sqlalchemy import select, desc
+import base64
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import AsyncIterator
+from sqlalchemy import select, desc, tuple_, insert, or_, event, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from .models import User, Lead, LeadAttachment, FAQ, Document, Project
+from sqlalchemy.orm import Session
+from .models import User, Lead, LeadArchive, LeadAttachment, LeadIdempotencyKey, FAQ, Document, Project
+from . import events, stats
+from .config import settings
+from .partitions import month_floor
+from .thumbnails import pick_thumb
 
-async def upsert_user(session: AsyncSession, tg_user: dict) -> User:
+def _insert(session: AsyncSession, model):
+    # ON CONFLICT есть только в диалектных insert()
+    dialect = session.bind.dialect.name
+    return (postgresql.insert if dialect == "postgresql" else sqlite.insert)(model)
+
+USER_CACHE_SIZE = 10000
+
+# telegram_id -> (user_id, (username, first_name, last_name)); пополняется только после коммита
+_user_cache: OrderedDict[int, tuple[int, tuple]] = OrderedDict()
+
+@event.listens_for(Session, "after_commit")
+def _remember_users(session: Session) -> None:
+    for telegram_id, entry in session.info.pop("pending_users", {}).items():
+        _user_cache[telegram_id] = entry
+        _user_cache.move_to_end(telegram_id)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_pending_users(session: Session) -> None:
+    session.info.pop("pending_users", None)
+
+async def upsert_user(session: AsyncSession, tg_user: dict) -> int:
     telegram_id = int(tg_user["id"])
-    res = await session.execute(select(User).where(User.telegram_id == telegram_id))
-    user = res.scalar_one_or_none()
-    if user:
-        user.username = tg_user.get("username")
-        user.first_name = tg_user.get("first_name")
-        user.last_name = tg_user.get("last_name")
-    else:
-        user = User(
-            telegram_id=telegram_id,
-            username=tg_user.get("username"),
-            first_name=tg_user.get("first_name"),
-            last_name=tg_user.get("last_name"),
+    profile = (tg_user.get("username"), tg_user.get("first_name"), tg_user.get("last_name"))
+    cached = _user_cache.get(telegram_id)
+    if cached is not None and cached[1] == profile:
+        _user_cache.move_to_end(telegram_id)
+        return cached[0]
+
+    stmt = _insert(session, User).values(
+        telegram_id=telegram_id,
+        username=profile[0],
+        first_name=profile[1],
+        last_name=profile[2],
+    )
+    changed = or_(*(
+        getattr(User, col).is_distinct_from(stmt.excluded[col])
+        for col in ("username", "first_name", "last_name")
+    ))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={col: stmt.excluded[col] for col in ("username", "first_name", "last_name")},
+        where=changed,
+    ).returning(User.id)
+    user_id = (await session.execute(stmt)).scalar_one_or_none()
+    if user_id is None:
+        # профиль не менялся — апдейт пропущен, RETURNING пуст
+        user_id = (await session.execute(select(User.id).where(User.telegram_id == telegram_id))).scalar_one()
+    session.sync_session.info.setdefault("pending_users", {})[telegram_id] = (user_id, profile)
+    return user_id
+
+async def create_lead(session: AsyncSession, lead_data: dict, user_id: int | None = None) -> Lead:
+    leads = await create_leads_batch(session, [lead_data], user_id=user_id)
+    return leads[0]
+
+def attachment_row(lead_id: int, lead_created_at: datetime, attachment: str | dict) -> dict:
+    # строка — только file_id (старые клиенты), словарь — фото со всеми размерами
+    if isinstance(attachment, str):
+        attachment = {"file_id": attachment}
+    sizes = attachment.get("sizes") or []
+    return {
+        "lead_id": lead_id,
+        "lead_created_at": lead_created_at,
+        "file_id": attachment["file_id"],
+        "file_type": attachment.get("file_type") or "photo",
+        "file_unique_id": attachment.get("file_unique_id"),
+        "width": attachment.get("width"),
+        "height": attachment.get("height"),
+        "file_size": attachment.get("file_size"),
+        "sizes": sizes or None,
+        "thumb_file_id": pick_thumb(sizes, settings.thumb_min_side),
+    }
+
+class IdempotencyKeyConflict(Exception):
+    """Ключ уже занят, но заявки с ним у этого отправителя нет: чужая заявка
+    (другой user_id) или заявка удалена. Чужую не отдаём, удалённую не воскрешаем."""
+
+    def __init__(self, keys: list[str]):
+        super().__init__(f"idempotency keys taken by other leads: {', '.join(keys)}")
+        self.keys = keys
+
+def _owned_by(model, user_id: int | None):
+    return model.user_id == user_id if user_id is not None else model.user_id.is_(None)
+
+async def create_leads_batch(session: AsyncSession, items: list[dict], user_id: int | None = None) -> list[Lead]:
+    """Все заявки и вложения — одной транзакцией; повтор с тем же idempotency_key
+    не создаёт дубль, а возвращает уже сохранённую заявку. Порядок — как во входе.
+    Повтор находит только заявку того же user_id (у бота — без пользователя);
+    иначе IdempotencyKeyConflict и откат всей пачки."""
+    keys = [item.get("idempotency_key") or uuid.uuid4().hex for item in items]
+    rows: dict[str, dict] = {}
+    for key, item in zip(keys, items):
+        rows.setdefault(key, {
+            "user_id": user_id,
+            "lead_type": item["lead_type"],
+            "name": item.get("name"),
+            "phone": item.get("phone"),
+            "city": item.get("city"),
+            "work_type": item.get("work_type"),
+            "budget": item.get("budget"),
+            "description": item.get("description"),
+            "status": "new",
+            "idempotency_key": key,
+            "attachments": item.get("attachments") or [],
+        })
+
+    # сначала «занимаем» ключи: INSERT ... ON CONFLICT DO NOTHING RETURNING вернёт только новые;
+    # параллельный запрос с тем же ключом ждёт здесь коммита первого и получает повтор
+    claim = (
+        _insert(session, LeadIdempotencyKey)
+        .on_conflict_do_nothing(index_elements=[LeadIdempotencyKey.key])
+        .returning(LeadIdempotencyKey.key)
+    )
+    claimed = set((await session.scalars(claim, [{"key": key} for key in rows])).all())
+
+    # insertmanyvalues: один многострочный INSERT ... RETURNING
+    created = []
+    lead_rows = [{k: v for k, v in row.items() if k != "attachments"} for key, row in rows.items() if key in claimed]
+    if lead_rows:
+        stmt = insert(Lead).returning(Lead.id, Lead.idempotency_key, Lead.created_at)
+        created = (await session.execute(stmt, lead_rows)).all()
+
+    attachments = [
+        attachment_row(lead_id, created_at, attachment)
+        for lead_id, key, created_at in created
+        for attachment in rows[key]["attachments"]
+    ]
+    if attachments:
+        await session.execute(insert(LeadAttachment), attachments)
+
+    # в свёртку попадают только действительно вставленные строки, не повторы
+    await stats.apply(session, Counter(
+        stats.stat_key(created_at, "new", rows[key]["lead_type"], rows[key]["city"], rows[key]["work_type"])
+        for _, key, created_at in created
+    ))
+
+    by_key: dict[str, Lead] = {}
+    if created:
+        # новые — по id с нижней границей created_at, чтобы не обходить старые секции
+        res = await session.execute(select(Lead).where(
+            Lead.id.in_([lead_id for lead_id, _, _ in created]),
+            Lead.created_at >= min(created_at for _, _, created_at in created),
+        ))
+        by_key.update((lead.idempotency_key, lead) for lead in res.scalars())
+    repeated = [key for key in rows if key not in claimed]
+    if repeated:
+        res = await session.execute(
+            select(Lead)
+            .where(Lead.idempotency_key.in_(repeated), _owned_by(Lead, user_id))
+            .order_by(Lead.created_at)
         )
-        session.add(user)
+        by_key.update((lead.idempotency_key, lead) for lead in res.scalars())
+        archived = [key for key in repeated if key not in by_key]
+        if archived:
+            # ключ пережил заявку, которую архиватор уже перенёс в leads_archive
+            res = await session.execute(
+                select(LeadArchive).where(LeadArchive.idempotency_key.in_(archived), _owned_by(LeadArchive, user_id))
+            )
+            by_key.update((lead.idempotency_key, lead) for lead in res.scalars())
+        missing = [key for key in repeated if key not in by_key]
+        if missing:
+            await session.rollback()
+            raise IdempotencyKeyConflict(missing)
+    await events.emit(session, events.LEAD_CREATED, [by_key[key] for _, key, _ in created])
     await session.commit()
-    await session.refresh(user)
-    return user
-
-async def create_lead(session: AsyncSession, lead_data: dict, user: User | None = None) -> Lead:
-    lead = Lead(
-        user_id=user.id if user else None,
-        lead_type=lead_data["lead_type"],
-        name=lead_data.get("name"),
-        phone=lead_data.get("phone"),
-        city=lead_data.get("city"),
-        work_type=lead_data.get("work_type"),
-        budget=lead_data.get("budget"),
-        description=lead_data.get("description"),
-        status="new",
+    return [by_key[key] for key in keys]
+
+async def get_lead(session: AsyncSession, lead_id: int) -> Lead | None:
+    res = await session.execute(select(Lead).where(Lead.id == lead_id))
+    return res.scalar_one_or_none()
+
+async def get_attachments(session: AsyncSession, lead_id: int) -> list[LeadAttachment]:
+    res = await session.execute(
+        select(LeadAttachment).where(LeadAttachment.lead_id == lead_id).order_by(LeadAttachment.id)
     )
-    session.add(lead)
-    await session.flush()
+    return list(res.scalars())
+
+# new -> in_progress -> done / rejected
+LEAD_STATUSES = ("new", "in_progress", "done", "rejected")
+STATUS_TRANSITIONS: dict[str, frozenset[str]] = {
+    "new": frozenset({"in_progress"}),
+    "in_progress": frozenset({"done", "rejected"}),
+    "done": frozenset(),
+    "rejected": frozenset(),
+}
+
+# конечные статусы: только такие заявки уходят из горячего окна и в архив
+CLOSED_STATUSES = tuple(s for s in LEAD_STATUSES if not STATUS_TRANSITIONS[s])
 
-    for file_id in (lead_data.get("attachments") or []):
-        session.add(LeadAttachment(lead_id=lead.id, file_id=file_id, file_type="photo"))
+def allowed_sources(target: str) -> list[str]:
+    return [src for src in LEAD_STATUSES if target in STATUS_TRANSITIONS[src]]
+
+async def update_leads_status(
+    session: AsyncSession,
+    target: str,
+    refs: list[tuple[int, int | None]] | None = None,
+    filters: dict | None = None,
+    limit: int | None = None,
+) -> tuple[list[Lead], list[dict]]:
+    """Перевести заявки в статус target: UPDATE ... RETURNING id на каждый
+    допустимый исходный статус (при текущей схеме переходов он один) и один
+    SELECT обновлённых строк для ответа, свёртки и ленты событий.
+
+    refs — пары (id, ожидаемая version или None), иначе filters как у lead_conditions;
+    limit — не больше стольких заявок по filters (младшие id первыми).
+    Возвращает (обновлённые заявки, конфликты [{id, reason, status, version}])."""
+    if refs is not None:
+        versioned = [(i, v) for i, v in refs if v is not None]
+        unversioned = [i for i, v in refs if v is None]
+        conds = []
+        if versioned:
+            conds.append(tuple_(Lead.id, Lead.version).in_(versioned))
+        if unversioned:
+            conds.append(Lead.id.in_(unversioned))
+        match = [or_(*conds)]
+    else:
+        match = lead_conditions(**(filters or {}))
+
+    sources: dict[int, str] = {}
+    for source in allowed_sources(target):
+        where = [*match, Lead.status == source]
+        if refs is None and limit is not None:
+            left = limit - len(sources)
+            if left <= 0:
+                break
+            # у UPDATE нет LIMIT (ни в Postgres, ни в SQLite) — ограничиваем подзапросом по id
+            where = [Lead.id.in_(select(Lead.id).where(*where).order_by(Lead.id).limit(left)), Lead.status == source]
+        stmt = (
+            update(Lead)
+            .where(*where)
+            .values(status=target, version=Lead.version + 1)
+            .returning(Lead.id)
+            .execution_options(synchronize_session=False)
+        )
+        sources.update((lead_id, source) for lead_id in (await session.scalars(stmt)).all())
 
+    # attachment_count — подзапрос, в RETURNING его не взять; дочитываем строки тем же снимком
+    updated: list[Lead] = []
+    deltas: Counter = Counter()
+    if sources:
+        res = await session.execute(
+            select(Lead).where(Lead.id.in_(list(sources))).order_by(Lead.id).execution_options(populate_existing=True)
+        )
+        for lead in res.scalars():
+            deltas[stats.lead_key(lead, sources[lead.id])] -= 1
+            deltas[stats.lead_key(lead)] += 1
+            updated.append(lead)
+
+    conflicts: list[dict] = []
+    if refs is not None:
+        missed = {i: v for i, v in refs if i not in sources}
+        if missed:
+            res = await session.execute(select(Lead.id, Lead.status, Lead.version).where(Lead.id.in_(list(missed))))
+            current = {row.id: row for row in res}
+            for lead_id, expected in missed.items():
+                row = current.get(lead_id)
+                if row is None:
+                    reason = "not_found"
+                elif row.status == target:
+                    reason = "unchanged"
+                elif target not in STATUS_TRANSITIONS.get(row.status, ()):
+                    reason = "invalid_transition"
+                else:
+                    reason = "version_conflict"
+                conflicts.append({
+                    "id": lead_id,
+                    "reason": reason,
+                    "status": row.status if row else None,
+                    "version": row.version if row else None,
+                })
+
+    await stats.apply(session, deltas)
+    await events.emit(session, events.LEAD_UPDATED, updated)
     await session.commit()
-    await session.refresh(lead)
-    return lead
+    return updated, conflicts
+
+def encode_cursor(lead: Lead) -> str:
+    raw = f"{lead.created_at.isoformat()}|{lead.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    # ValueError на любой мусор — наверху превращается в 400
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, lead_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(lead_id)
+    except Exception as e:
+        raise ValueError("Bad cursor") from e
 
-async def list_leads(session: AsyncSession, limit: int = 200) -> list[Lead]:
-    res = await session.execute(select(Lead).order_by(desc(Lead.created_at)).limit(limit))
+def hot_since(now: datetime | None = None) -> datetime | None:
+    """Начало «горячего» окна для закрытых заявок: первое число месяца LEAD_HOT_MONTHS - 1
+    месяцев назад (граница совпадает с границей месячной секции). None — окно выключено."""
+    months = settings.lead_hot_months
+    if months <= 0:
+        return None
+    return month_floor(now or datetime.utcnow(), 1 - months)
+
+def lead_conditions(
+    status: str | None = None,
+    lead_type: str | None = None,
+    city: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    hot_only: bool = False,
+    model=Lead,
+) -> list:
+    """hot_only без явного created_from — закрытые (done/rejected) заявки только из
+    горячего окна; открытые видны всегда, сколько бы им ни было. С фильтром по
+    закрытому статусу Postgres читает лишь последние месячные секции.
+    model — Lead или LeadArchive."""
+    conds = []
+    since = hot_since() if hot_only and created_from is None else None
+    if since is not None:
+        if status in CLOSED_STATUSES:
+            created_from = since
+        elif not status:
+            conds.append(or_(model.status.not_in(CLOSED_STATUSES), model.created_at >= since))
+    if status:
+        conds.append(model.status == status)
+    if lead_type:
+        conds.append(model.lead_type == lead_type)
+    if city:
+        conds.append(model.city == city)
+    if created_from:
+        conds.append(model.created_at >= created_from)
+    if created_to:
+        conds.append(model.created_at < created_to)
+    return conds
+
+async def list_leads(
+    session: AsyncSession,
+    limit: int = 200,
+    after: tuple[datetime, int] | None = None,
+    hot_only: bool = True,
+    **filters,
+) -> list[Lead]:
+    stmt = select(Lead).where(*lead_conditions(hot_only=hot_only, **filters))
+    if after is not None:
+        stmt = stmt.where(tuple_(Lead.created_at, Lead.id) < tuple_(*after))
+    stmt = stmt.order_by(desc(Lead.created_at), desc(Lead.id)).limit(limit)
+    res = await session.execute(stmt)
     return list(res.scalars().all())
 
+async def stream_leads(
+    session: AsyncSession,
+    yield_per: int = 500,
+    hot_only: bool = True,
+    archived: bool = False,
+    **filters,
+) -> AsyncIterator[Lead | LeadArchive]:
+    # серверный курсор: строки приходят пачками по yield_per, таблица целиком в память не грузится;
+    # archived — выгрузка из leads_archive (закрытые заявки, перенесённые архиватором)
+    model = LeadArchive if archived else Lead
+    stmt = (
+        select(model)
+        .where(*lead_conditions(hot_only=hot_only and not archived, model=model, **filters))
+        .order_by(desc(model.created_at), desc(model.id))
+        .execution_options(yield_per=yield_per)
+    )
+    result = await session.stream_scalars(stmt)
+    async for lead in result:
+        yield lead
+
 async def get_faq(session: AsyncSession) -> list[FAQ]:
     res = await session.execute(select(FAQ).order_by(FAQ.id.asc()))
     return list(res.scalars().all())
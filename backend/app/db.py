@@ -1,13 +1,114 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import BigInteger, Integer, MetaData, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncConnection
 from sqlalchemy.orm import DeclarativeBase
 from .config import settings
+from .metrics import TimedQueuePool, instrument_engine
 
-engine = create_async_engine(settings.database_url, echo=False, pool_pre_ping=True)
+# Ключи pg_advisory_lock всех модулей — только здесь, чтобы не совпали:
+# занятый чужим процессом ключ молча блокирует или пропускает работу.
+MIGRATE_LOCK_ID = 0x62726761_0001  # migrate: одна миграция за раз
+SEED_LOCK_ID = 0x62726761_0002  # seed: сидирует один процесс
+ARCHIVE_LOCK_ID = 0x62726761_0003  # archive: один проход архиватора на базу
+
+def _engine_options(url: str, name: str, pool_size: int, max_overflow: int, read_only: bool = False) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    connect_args = {
+        # кэш подготовленных запросов: и адаптера SQLAlchemy, и самого asyncpg
+        "prepared_statement_cache_size": settings.db_statement_cache_size,
+        "statement_cache_size": settings.db_statement_cache_size,
+        "command_timeout": settings.db_command_timeout,
+    }
+    if read_only:
+        # пул чтения пишущий запрос не пропустит, даже если смотрит на основную базу
+        connect_args["server_settings"] = {"default_transaction_read_only": "on"}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_logging_name": name,
+        "connect_args": connect_args,
+    }
+
+engine = create_async_engine(
+    settings.database_url,
+    **_engine_options(settings.database_url, "primary", settings.db_pool_size, settings.db_max_overflow),
+)
+instrument_engine(engine, "primary")
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+_read_url = settings.db_replica_url or settings.database_url
+read_engine = create_async_engine(
+    _read_url,
+    **_engine_options(_read_url, "read", settings.db_read_pool_size, settings.db_read_max_overflow, read_only=True),
+)
+instrument_engine(read_engine, "read")
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+
 class Base(DeclarativeBase):
     pass
 
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_session() -> AsyncSession:
+    # только для чтения; с репликой данные могут отставать на время репликации
+    async with ReadSessionLocal() as session:
+        yield session
+
+def _add_missing_columns(sync_conn, metadata: MetaData) -> None:
+    # create_all не трогает существующие таблицы: докидываем новые колонки,
+    # если они nullable или у них есть server_default
+    insp = inspect(sync_conn)
+    for table in metadata.sorted_tables:
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=sync_conn.dialect)
+            if column.nullable:
+                sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+            elif column.server_default is not None:
+                default = column.server_default.arg
+                sync_conn.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type} NOT NULL DEFAULT {default}'
+                ))
+
+def _widen_integer_columns(sync_conn, metadata: MetaData) -> None:
+    # Integer -> BigInteger в модели (например users.telegram_id): в SQLite и так 64 бита
+    if sync_conn.dialect.name != "postgresql":
+        return
+    insp = inspect(sync_conn)
+    for table in metadata.sorted_tables:
+        reflected = {c["name"]: c["type"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if isinstance(column.type, BigInteger) and isinstance(reflected.get(column.name), Integer) \
+                    and not isinstance(reflected[column.name], BigInteger):
+                sync_conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE BIGINT'))
+
+def _create_indexes(sync_conn, metadata: MetaData) -> None:
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+async def sync_metadata(conn: AsyncConnection, metadata: MetaData) -> None:
+    """Догнать базу до metadata: новые таблицы, недостающие колонки, BIGINT, индексы."""
+    await conn.run_sync(metadata.create_all)
+    await conn.run_sync(_add_missing_columns, metadata)
+    await conn.run_sync(_widen_integer_columns, metadata)
+    await conn.run_sync(_create_indexes, metadata)
+
+async def ensure_schema(conn: AsyncConnection) -> None:
+    """Схема прямо из текущих моделей — для локальных экспериментов на пустой базе.
+    Миграции (app.migrate) её не используют: у них своя, замороженная схема,
+    а в Postgres секционирование делает только миграция 4."""
+    from . import models  # noqa: F401  (регистрирует таблицы в Base.metadata)
+    from .search import POSTGRES_DDL
+    await sync_metadata(conn, Base.metadata)
+    if conn.dialect.name == "postgresql":
+        for ddl in POSTGRES_DDL:
+            await conn.execute(text(ddl))
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import orjson
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .db import AsyncSessionLocal, engine
+from .models import Lead
+from .serializers import lead_to_dict
+
+log = logging.getLogger(__name__)
+
+# Дельты по заявкам для /api/admin/leads/stream (SSE).
+# SQLite / один процесс: события копятся в session.info и публикуются после коммита.
+# Postgres: в транзакции делается pg_notify (уходит только при коммите), каждый
+# воркер слушает канал и сам достаёт заявки — так ленту видят все воркеры.
+
+CHANNEL = "lead_events"
+HISTORY_SIZE = 1000
+SUBSCRIBER_QUEUE = 256
+NOTIFY_CHUNK = 500  # payload NOTIFY ограничен 8000 байт
+HEARTBEAT = 15.0
+LEAD_CREATED = "lead.created"
+LEAD_UPDATED = "lead.updated"
+RESET = "reset"
+
+class _Subscriber:
+    def __init__(self):
+        self.queue: asyncio.Queue[tuple[str, str, dict]] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.lagged = False
+
+class LeadEventBroker:
+    """Рассылка дельт подписчикам в памяти процесса. id события — '<instance>:<seq>';
+    последние HISTORY_SIZE событий хранятся для докачки по Last-Event-ID.
+    Если докачать нельзя (чужой воркер, рестарт, история ушла), клиент
+    получает событие reset и перечитывает список целиком."""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.instance = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._history: deque[tuple[int, str, dict]] = deque(maxlen=history_size)
+        self._subscribers: set[_Subscriber] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self._notified: asyncio.Queue[str] = asyncio.Queue()
+
+    @property
+    def uses_notify(self) -> bool:
+        return engine.dialect.name == "postgresql"
+
+    def _event_id(self, seq: int) -> str:
+        return f"{self.instance}:{seq}"
+
+    def publish(self, kind: str, lead: dict) -> None:
+        self._seq += 1
+        self._history.append((self._seq, kind, lead))
+        item = (self._event_id(self._seq), kind, lead)
+        for sub in self._subscribers:
+            if sub.lagged:
+                continue
+            try:
+                sub.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # медленный клиент: не копим за него, а просим перечитать список
+                sub.lagged = True
+
+    def reset_all(self) -> None:
+        for sub in self._subscribers:
+            sub.lagged = True
+
+    def _replay(self, last_event_id: str) -> Optional[list[tuple[str, str, dict]]]:
+        instance, _, seq = last_event_id.partition(":")
+        if instance != self.instance or not seq.isdigit():
+            return None
+        last = int(seq)
+        if last > self._seq or (self._history and last < self._history[0][0] - 1):
+            return None
+        return [(self._event_id(s), kind, lead) for s, kind, lead in self._history if s > last]
+
+    async def subscribe(self, last_event_id: Optional[str] = None) -> AsyncIterator[tuple[str, str, dict]]:
+        """Поток (id, event, data); None-элемент означает паузу (для heartbeat)."""
+        sub = _Subscriber()
+        self._subscribers.add(sub)
+        try:
+            if last_event_id:
+                missed = self._replay(last_event_id)
+                if missed is None:
+                    yield self._event_id(self._seq), RESET, {}
+                else:
+                    for item in missed:
+                        yield item
+            while True:
+                if sub.lagged:
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.lagged = False
+                    yield self._event_id(self._seq), RESET, {}
+                    continue
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._subscribers.discard(sub)
+
+    def metrics(self) -> dict:
+        return {"subscribers": len(self._subscribers), "last_seq": self._seq}
+
+    # --- Postgres LISTEN/NOTIFY ---
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._notified.put_nowait(payload)
+
+    async def _publish_from_db(self, payloads: list[str]) -> None:
+        parsed = [json.loads(p) for p in payloads]
+        ids = {i for p in parsed for i in p["ids"]}
+        async with AsyncSessionLocal() as session:
+            res = await session.execute(select(Lead).where(Lead.id.in_(ids)))
+            leads = {lead.id: lead_to_dict(lead) for lead in res.scalars()}
+        for p in parsed:
+            for lead_id in p["ids"]:
+                if lead_id in leads:
+                    self.publish(p["type"], leads[lead_id])
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.add_listener(CHANNEL, self._on_notify)
+                    try:
+                        while True:
+                            payloads = [await self._notified.get()]
+                            while not self._notified.empty():
+                                payloads.append(self._notified.get_nowait())
+                            await self._publish_from_db(payloads)
+                    finally:
+                        await raw.remove_listener(CHANNEL, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # за время переподключения уведомления могли потеряться
+                log.warning("lead events listener failed, reconnecting", exc_info=True)
+                self.reset_all()
+                await asyncio.sleep(1.0)
+
+    async def start(self) -> None:
+        if self.uses_notify and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+lead_events = LeadEventBroker()
+
+async def emit(session: AsyncSession, kind: str, leads: list[Lead]) -> None:
+    """Запланировать событие по заявкам; уйдёт подписчикам только после коммита."""
+    if not leads:
+        return
+    if session.bind.dialect.name == "postgresql":
+        ids = [lead.id for lead in leads]
+        for i in range(0, len(ids), NOTIFY_CHUNK):
+            payload = json.dumps({"type": kind, "ids": ids[i:i + NOTIFY_CHUNK]})
+            await session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+    else:
+        session.info.setdefault("lead_events", []).extend((kind, lead_to_dict(lead)) for lead in leads)
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for kind, lead in session.info.pop("lead_events", []):
+        lead_events.publish(kind, lead)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_uncommitted(session: Session) -> None:
+    session.info.pop("lead_events", None)
+
+def sse_format(event_id: str, kind: str, data: dict) -> str:
+    body = orjson.dumps(data).decode("utf-8")
+    return f"id: {event_id}\nevent: {kind}\ndata: {body}\n\n"
@@ -0,0 +1,50 @@
+import csv
+import io
+from typing import AsyncIterator
+
+import orjson
+
+from . import crud
+from .db import ReadSessionLocal
+from .serializers import lead_to_dict
+
+CSV_HEADER = ["id","lead_type","name","phone","city","work_type","budget","status","created_at","description"]
+CHUNK_SIZE = 64 * 1024
+
+# Сессию открываем внутри генератора: зависимость get_read_session закрывается
+# раньше, чем StreamingResponse успевает дочитать курсор. Пул — читающий
+# (реплика, если есть), чтобы выгрузка не занимала соединения приёма заявок.
+# filters — как у crud.stream_leads, в том числе hot_only и archived (leads_archive).
+
+async def csv_chunks(**filters) -> AsyncIterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    # заголовок уходит клиенту до того, как база вернёт первую строку
+    yield out.getvalue().encode("utf-8")
+    out.seek(0)
+    out.truncate()
+    async with ReadSessionLocal() as session:
+        async for l in crud.stream_leads(session, **filters):
+            writer.writerow([l.id,l.lead_type,l.name,l.phone,l.city,l.work_type,l.budget,l.status,l.created_at.isoformat(), (l.description or "").replace("\n"," ")])
+            if out.tell() >= CHUNK_SIZE:
+                yield out.getvalue().encode("utf-8")
+                out.seek(0)
+                out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+async def ndjson_chunks(**filters) -> AsyncIterator[bytes]:
+    buf: list[bytes] = []
+    size = 0
+    async with ReadSessionLocal() as session:
+        async for lead in crud.stream_leads(session, **filters):
+            line = orjson.dumps(lead_to_dict(lead))
+            buf.append(line)
+            size += len(line) + 1
+            if size >= CHUNK_SIZE:
+                yield b"\n".join(buf) + b"\n"
+                buf.clear()
+                size = 0
+    if buf:
+        yield b"\n".join(buf) + b"\n"
@@ -1,19 +1,24 @@
-from fastapi import FastAPI, Depends, Header, HTTPException, Response
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import Optional
-import csv
-import io
+from datetime import date, datetime
+import importlib
+import hmac
 
-from .db import engine, Base, get_session
+from .db import engine, get_read_session, get_session
 from .config import settings
 from .telegram_auth import get_user_from_init_data, TelegramAuthError
-from . import crud
-from .schemas import FAQOut, DocumentOut, ProjectOut, LeadCreate, LeadOut, LeadStatusUpdate
-from .models import Lead
-from .seed import seed_from_file
+from . import crud, export, metrics, search, stats
+from .archive import lead_archiver
+from .events import lead_events, sse_format
+from .thumbnails import SHA256_RE, thumbnail_store, thumbnail_worker
+from .schemas import FAQOut, DocumentOut, ProjectOut, LeadCreate, LeadBatchIn, LeadOut, LeadPage, LeadStatusUpdate, LeadBulkStatusUpdate, LeadBulkResult, StatsOut, AttachmentOut, BULK_MAX_LEADS
+from .migrate import migrate, pending_migrations
+from .content_cache import content_cache, etag_matches
+from .serializers import lead_to_dict
+from .static_assets import PrecompressedStaticFiles, asset_dir
 
 app = FastAPI(title="BrigAdress Showcase API", version="1.0.0")
 
@@ -25,25 +30,82 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+@app.exception_handler(crud.IdempotencyKeyConflict)
+async def idempotency_conflict(request: Request, exc: crud.IdempotencyKeyConflict):
+    # ключ занят чужой или удалённой заявкой: её не отдаём, пачку не сохраняем
+    return ORJSONResponse(status_code=409, content={"detail": {"reason": "idempotency_key_conflict", "keys": exc.keys}})
+
+metrics.REGISTRY.add_callback("lead_events", lead_events.metrics)
+metrics.REGISTRY.add_callback("thumb_worker", thumbnail_worker.metrics)
+metrics.REGISTRY.add_callback("lead_archiver", lead_archiver.metrics)
 
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    # seed content from file
-    async for session in get_session():
-        await seed_from_file(session, "seed_content.json")
-        break
+    # схема и контент — `python -m app.migrate` до запуска воркеров; здесь только сверка версии
+    async with engine.connect() as conn:
+        pending = await pending_migrations(conn)
+    if pending:
+        if not settings.auto_migrate:
+            names = ", ".join(f"{m.version}_{m.name}" for m in pending)
+            raise RuntimeError(f"database schema is behind ({names}); run `python -m app.migrate`")
+        await migrate("seed_content.json")
+    await lead_events.start()
+    if settings.thumb_worker:
+        await thumbnail_worker.start()
+    if settings.archive_worker:
+        await lead_archiver.start()
 
 
 # Serve static site and webapp
-app.mount("/site", StaticFiles(directory="static/site", html=True), name="site")
-app.mount("/webapp", StaticFiles(directory="static/webapp", html=True), name="webapp")
+# (build/static, если есть результат `python -m app.static_assets build`, иначе static)
+app.mount("/site", PrecompressedStaticFiles(directory=asset_dir("site"), html=True), name="site")
+app.mount("/webapp", PrecompressedStaticFiles(directory=asset_dir("webapp"), html=True), name="webapp")
+
+# Optional: accept Telegram webhook updates in this process
+bot_webhook = None
+if settings.bot_webhook_app:
+    module_name, _, attr = settings.bot_webhook_app.partition(":")
+    bot_webhook = getattr(importlib.import_module(module_name), attr)
+    app.mount(settings.bot_webhook_path, bot_webhook, name="bot_webhook")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await lead_events.stop()
+    await thumbnail_worker.stop()
+    await lead_archiver.stop()
+    if bot_webhook is not None:
+        await bot_webhook.shutdown()
 
 @app.get("/api/health")
 async def health():
     return {"ok": True}
 
+def _require_metrics_token(authorization: Optional[str]) -> None:
+    if settings.metrics_token and not hmac.compare_digest(authorization or "", f"Bearer {settings.metrics_token}"):
+        raise HTTPException(status_code=401, detail="Bad metrics token")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(default=None)):
+    _require_metrics_token(authorization)
+    body = await metrics.REGISTRY.render()
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(
+    seconds: float = Query(default=30.0, gt=0, le=metrics.SamplingProfiler.MAX_SECONDS),
+    hz: float = Query(default=100.0, ge=1, le=1000),
+    authorization: Optional[str] = Header(default=None),
+):
+    if not settings.profiler_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    _require_metrics_token(authorization)
+    try:
+        body = await metrics.profiler.profile(seconds, hz)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=body, media_type="text/plain; charset=utf-8")
+
 def _require_init_data(init_data: Optional[str]) -> dict:
     if not init_data:
         raise HTTPException(status_code=401, detail="Missing Telegram initData")
@@ -58,20 +120,24 @@ def _require_init_data(init_data: Optional[str]) -> dict:
 def _is_admin(tg_id: int) -> bool:
     return tg_id in settings.admin_ids
 
+async def _content_response(name: str, if_none_match: Optional[str]) -> Response:
+    entry = await content_cache.get(name)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 @app.get("/api/content/faq", response_model=list[FAQOut])
-async def api_faq(session: AsyncSession = Depends(get_session)):
-    items = await crud.get_faq(session)
-    return [{"id": i.id, "question": i.question, "answer": i.answer} for i in items]
+async def api_faq(if_none_match: Optional[str] = Header(default=None)):
+    return await _content_response("faq", if_none_match)
 
 @app.get("/api/content/documents", response_model=list[DocumentOut])
-async def api_docs(session: AsyncSession = Depends(get_session)):
-    items = await crud.get_documents(session)
-    return [{"id": i.id, "title": i.title, "url": f"/site/{i.path}"} for i in items]
+async def api_docs(if_none_match: Optional[str] = Header(default=None)):
+    return await _content_response("documents", if_none_match)
 
 @app.get("/api/content/projects", response_model=list[ProjectOut])
-async def api_projects(session: AsyncSession = Depends(get_session)):
-    items = await crud.get_projects(session)
-    return [{"id": i.id, "title": i.title, "description": i.description, "image": i.image} for i in items]
+async def api_projects(if_none_match: Optional[str] = Header(default=None)):
+    return await _content_response("projects", if_none_match)
 
 @app.post("/api/leads", response_model=LeadOut)
 async def create_lead(
@@ -80,71 +146,143 @@ async def create_lead(
     x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
 ):
     tg_user = _require_init_data(x_telegram_init_data)
-    user = await crud.upsert_user(session, tg_user)
-    lead = await crud.create_lead(session, payload.model_dump(), user=user)
-    return {
-        "id": lead.id,
-        "lead_type": lead.lead_type,
-        "name": lead.name,
-        "phone": lead.phone,
-        "city": lead.city,
-        "work_type": lead.work_type,
-        "budget": lead.budget,
-        "description": lead.description,
-        "status": lead.status,
-        "created_at": lead.created_at.isoformat(),
-        "attachment_count": len(lead.attachments),
+    user_id = await crud.upsert_user(session, tg_user)
+    lead = await crud.create_lead(session, payload.model_dump(), user_id=user_id)
+    return ORJSONResponse(lead_to_dict(lead))
+
+def _require_bot_token(x_bot_token: Optional[str]) -> None:
+    # For internal bot service: authenticate by BOT_TOKEN (same token).
+    if not x_bot_token or not hmac.compare_digest(x_bot_token, settings.bot_token):
+        raise HTTPException(status_code=401, detail="Bad bot token")
 
-    }
 @app.post("/api/bot/leads", response_model=LeadOut)
 async def create_lead_from_bot(
     payload: LeadCreate,
     session: AsyncSession = Depends(get_session),
     x_bot_token: Optional[str] = Header(default=None, alias="X-Bot-Token"),
 ):
-    # For internal bot service: authenticate by BOT_TOKEN (same token).
-    if not x_bot_token or x_bot_token != settings.bot_token:
-        raise HTTPException(status_code=401, detail="Bad bot token")
-    # no tg initData here; create/update user by telegram_id if provided via payload.description? not.
+    _require_bot_token(x_bot_token)
     # Bot will include telegram user fields inside description; still store lead without user link.
-    lead = await crud.create_lead(session, payload.model_dump(), user=None)
+    # A retried request with the same idempotency_key returns the already stored lead.
+    leads = await crud.create_leads_batch(session, [payload.model_dump()])
+    return ORJSONResponse(lead_to_dict(leads[0]))
+
+@app.post("/api/bot/leads:batch", response_model=list[LeadOut])
+async def create_leads_batch_from_bot(
+    payload: LeadBatchIn,
+    session: AsyncSession = Depends(get_session),
+    x_bot_token: Optional[str] = Header(default=None, alias="X-Bot-Token"),
+):
+    _require_bot_token(x_bot_token)
+    leads = await crud.create_leads_batch(session, [item.model_dump() for item in payload.leads])
+    return ORJSONResponse([lead_to_dict(l) for l in leads])
+
+def lead_filters(
+    status: Optional[str] = None,
+    lead_type: Optional[str] = None,
+    city: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    history: bool = Query(default=False, description="include closed leads older than the hot window (LEAD_HOT_MONTHS)"),
+) -> dict:
     return {
-        "id": lead.id,
-        "lead_type": lead.lead_type,
-        "name": lead.name,
-        "phone": lead.phone,
-        "city": lead.city,
-        "work_type": lead.work_type,
-        "budget": lead.budget,
-        "description": lead.description,
-        "status": lead.status,
-        "created_at": lead.created_at.isoformat(),
-        "attachment_count": len(lead.attachments),
+        "status": status,
+        "lead_type": lead_type,
+        "city": city,
+        "created_from": created_from,
+        "created_to": created_to,
+        "hot_only": not history,
     }
 
-@app.get("/api/admin/leads", response_model=list[LeadOut])
+@app.get("/api/admin/leads", response_model=LeadPage)
 async def admin_list_leads(
+    session: AsyncSession = Depends(get_read_session),
+    x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+    limit: int = Query(default=200, ge=1, le=500),
+    cursor: Optional[str] = None,
+    filters: dict = Depends(lead_filters),
+):
+    tg_user = _require_init_data(x_telegram_init_data)
+    if not _is_admin(int(tg_user["id"])):
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        after = crud.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    leads = await crud.list_leads(session, limit=limit, after=after, **filters)
+    items = [lead_to_dict(l) for l in leads]
+    next_cursor = crud.encode_cursor(leads[-1]) if len(leads) == limit else None
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+@app.get("/api/admin/leads/search", response_model=LeadPage)
+async def admin_search_leads(
+    q: str = Query(min_length=2, max_length=200),
+    session: AsyncSession = Depends(get_read_session),
+    x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    filters: dict = Depends(lead_filters),
+):
+    tg_user = _require_init_data(x_telegram_init_data)
+    if not _is_admin(int(tg_user["id"])):
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        after = search.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    hits = await search.search_leads(session, q, limit=limit, after=after, conditions=crud.lead_conditions(**filters))
+    items = [lead_to_dict(l) for l, _ in hits]
+    next_cursor = search.encode_cursor(hits[-1][1], hits[-1][0].id) if len(hits) == limit else None
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+@app.get("/api/admin/leads/stream")
+async def admin_leads_stream(
+    request: Request,
+    x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+):
+    tg_user = _require_init_data(x_telegram_init_data)
+    if not _is_admin(int(tg_user["id"])):
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    async def body():
+        yield "retry: 3000\n\n"
+        async for item in lead_events.subscribe(last_event_id):
+            if await request.is_disconnected():
+                break
+            yield ": ping\n\n" if item is None else sse_format(*item)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _check_target_status(status: str) -> None:
+    if status not in crud.LEAD_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status: use {', '.join(crud.LEAD_STATUSES)}")
+
+@app.patch("/api/admin/leads", response_model=LeadBulkResult)
+async def admin_bulk_update_status(
+    payload: LeadBulkStatusUpdate,
     session: AsyncSession = Depends(get_session),
     x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
-    limit: int = 200,
 ):
     tg_user = _require_init_data(x_telegram_init_data)
     if not _is_admin(int(tg_user["id"])):
         raise HTTPException(status_code=403, detail="Admin only")
-    leads = await crud.list_leads(session, limit=limit)
-    return [{
-        "id": l.id,
-        "lead_type": l.lead_type,
-        "name": l.name,
-        "phone": l.phone,
-        "city": l.city,
-        "work_type": l.work_type,
-        "budget": l.budget,
-        "description": l.description,
-        "status": l.status,
-        "created_at": l.created_at.isoformat(),
-        "attachment_count": len(l.attachments),
-    } for l in leads]
+    _check_target_status(payload.status)
+
+    refs = [(ref.id, ref.version) for ref in payload.leads] if payload.leads is not None else None
+    filters = payload.filter.model_dump() if payload.filter is not None else None
+    updated, conflicts = await crud.update_leads_status(
+        session, payload.status, refs=refs, filters=filters, limit=BULK_MAX_LEADS,
+    )
+    return ORJSONResponse({
+        "updated": [lead_to_dict(l) for l in updated],
+        "conflicts": conflicts,
+        "has_more": filters is not None and len(updated) >= BULK_MAX_LEADS,
+    })
 
 @app.patch("/api/admin/leads/{lead_id}", response_model=LeadOut)
 async def admin_update_lead_status(
@@ -156,43 +294,103 @@ async def admin_update_lead_status(
     tg_user = _require_init_data(x_telegram_init_data)
     if not _is_admin(int(tg_user["id"])):
         raise HTTPException(status_code=403, detail="Admin only")
+    _check_target_status(payload.status)
 
-    res = await session.execute(select(Lead).where(Lead.id == lead_id))
-    lead = res.scalar_one_or_none()
-    if not lead:
+    updated, conflicts = await crud.update_leads_status(session, payload.status, refs=[(lead_id, payload.version)])
+    if updated:
+        return ORJSONResponse(lead_to_dict(updated[0]))
+    conflict = conflicts[0]
+    if conflict["reason"] == "not_found":
         raise HTTPException(status_code=404, detail="Lead not found")
+    if conflict["reason"] == "unchanged":
+        return ORJSONResponse(lead_to_dict(await crud.get_lead(session, lead_id)))
+    raise HTTPException(status_code=409, detail=conflict)
 
-    lead.status = payload.status
-    await session.commit()
-    await session.refresh(lead)
+@app.get("/api/admin/leads/{lead_id}/attachments", response_model=list[AttachmentOut])
+async def admin_lead_attachments(
+    lead_id: int,
+    session: AsyncSession = Depends(get_read_session),
+    x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+):
+    tg_user = _require_init_data(x_telegram_init_data)
+    if not _is_admin(int(tg_user["id"])):
+        raise HTTPException(status_code=403, detail="Admin only")
+    items = await crud.get_attachments(session, lead_id)
+    return ORJSONResponse([{
+        "id": a.id,
+        "file_type": a.file_type,
+        "width": a.width,
+        "height": a.height,
+        "file_size": a.file_size,
+        "thumb_url": f"/api/thumbs/{a.thumb_sha256}" if a.thumb_sha256 else None,
+    } for a in items])
+
+@app.get("/api/thumbs/{sha}")
+async def thumbnail(sha: str):
+    # адрес — sha256 содержимого: без initData (это <img src>), угадать нельзя, кэшируется навсегда
+    if not SHA256_RE.match(sha):
+        raise HTTPException(status_code=404, detail="Not found")
+    path = thumbnail_store.get(sha)
+    if path is None:
+        # вытеснен из кэша этой реплики — докачает свой воркер, база не трогается
+        thumbnail_worker.refetch(sha)
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
+@app.get("/api/admin/stats", response_model=StatsOut)
+async def admin_lead_stats(
+    session: AsyncSession = Depends(get_read_session),
+    x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+    group_by: str = Query(default="day,status", description="comma-separated: " + ",".join(stats.DIMENSIONS)),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = None,
+    lead_type: Optional[str] = None,
+    city: Optional[str] = None,
+):
+    tg_user = _require_init_data(x_telegram_init_data)
+    if not _is_admin(int(tg_user["id"])):
+        raise HTTPException(status_code=403, detail="Admin only")
+    dims = [d.strip() for d in group_by.split(",") if d.strip()]
+    unknown = [d for d in dims if d not in stats.DIMENSIONS]
+    if unknown or len(set(dims)) != len(dims):
+        raise HTTPException(status_code=400, detail=f"group_by: use {', '.join(stats.DIMENSIONS)}")
+    rows, as_of = await stats.query(
+        session, dims, date_from=date_from, date_to=date_to, status=status, lead_type=lead_type, city=city,
+    )
     return {
-        "id": lead.id,
-        "lead_type": lead.lead_type,
-        "name": lead.name,
-        "phone": lead.phone,
-        "city": lead.city,
-        "work_type": lead.work_type,
-        "budget": lead.budget,
-        "description": lead.description,
-        "status": lead.status,
-        "created_at": lead.created_at.isoformat(),
-        "attachment_count": len(lead.attachments),
+        "group_by": dims,
+        "rows": rows,
+        "total": sum(r["count"] for r in rows),
+        "as_of": as_of.isoformat() if as_of else None,
     }
 
 @app.get("/api/admin/export/leads.csv")
 async def admin_export_leads_csv(
-    session: AsyncSession = Depends(get_session),
     x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+    filters: dict = Depends(lead_filters),
+    archived: bool = Query(default=False, description="export archived (closed, moved to leads_archive) leads"),
 ):
     tg_user = _require_init_data(x_telegram_init_data)
     if not _is_admin(int(tg_user["id"])):
         raise HTTPException(status_code=403, detail="Admin only")
+    return StreamingResponse(
+        export.csv_chunks(archived=archived, **filters),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="leads.csv"'},
+    )
 
-    leads = await crud.list_leads(session, limit=5000)
-    out = io.StringIO()
-    writer = csv.writer(out)
-    writer.writerow(["id","lead_type","name","phone","city","work_type","budget","status","created_at","description"])
-    for l in leads:
-        writer.writerow([l.id,l.lead_type,l.name,l.phone,l.city,l.work_type,l.budget,l.status,l.created_at.isoformat(), (l.description or "").replace("\n"," ")])
-    return Response(content=out.getvalue(), media_type="text/csv; charset=utf-8")
+@app.get("/api/admin/export/leads.ndjson")
+async def admin_export_leads_ndjson(
+    x_telegram_init_data: Optional[str] = Header(default=None, alias="X-Telegram-Init-Data"),
+    filters: dict = Depends(lead_filters),
+    archived: bool = Query(default=False, description="export archived (closed, moved to leads_archive) leads"),
+):
+    tg_user = _require_init_data(x_telegram_init_data)
+    if not _is_admin(int(tg_user["id"])):
+        raise HTTPException(status_code=403, detail="Admin only")
+    return StreamingResponse(
+        export.ndjson_chunks(archived=archived, **filters),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="leads.ndjson"'},
+    )
@@ -0,0 +1,123 @@
+import contextvars
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .metrics_core import COUNT_BUCKETS, Registry, SamplingProfiler
+
+# Метрики процесса в текстовом формате Prometheus (GET /metrics). Без внешних
+# зависимостей: счётчики и гистограммы живут в памяти процесса, поэтому при
+# нескольких воркерах uvicorn каждый отдаёт свои — собирайте их по отдельности
+# или запускайте один воркер на контейнер.
+#
+# Пишется всё из одного event loop (обработчики SQLAlchemy-событий тоже
+# выполняются в его потоке), поэтому блокировок нет.
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+HTTP_DB_QUERIES = REGISTRY.histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ("method", "route"), COUNT_BUCKETS)
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("db", "operation"))
+DB_QUERY_ERRORS = REGISTRY.counter("db_query_errors_total", "SQL statements that raised", ("db", "operation"))
+DB_POOL_WAIT = REGISTRY.histogram(
+    "db_pool_checkout_seconds", "Time to get a connection from the pool (waiting + connecting)", ("db",))
+INIT_DATA_LATENCY = REGISTRY.histogram(
+    "init_data_verify_seconds", "Telegram initData verification time", ("result",),
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01))
+
+# --- HTTP ---
+
+# запросы к БД в рамках текущего HTTP-запроса: [count]; видно N+1 по маршрутам
+_request_queries: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("request_queries", default=None)
+
+class MetricsMiddleware:
+    """ASGI-middleware (не BaseHTTPMiddleware: та буферизует и ломает SSE-поток).
+    Метка route — шаблон пути (/api/admin/leads/{lead_id}), а не сам путь, чтобы
+    не плодить серии; запросы мимо всех маршрутов идут как "other"."""
+
+    def __init__(self, app, skip: tuple = ("/metrics",)):
+        self.app = app
+        self.skip = skip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            # для смонтированных приложений (/webapp, /site) — путь монтирования
+            template = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "other"
+            HTTP_LATENCY.observe(elapsed, scope["method"], template, status[0])
+            HTTP_DB_QUERIES.observe(queries[0], scope["method"], template)
+
+# --- SQLAlchemy ---
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+def instrument_engine(engine, name: str) -> None:
+    """Счётчики и время SQL-запросов через события движка; name — метка db (primary / read)."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.observe(time.perf_counter() - start, name, _operation(statement))
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("query_start") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+        DB_QUERY_ERRORS.inc(name, _operation(ctx.statement or ""))
+
+    if hasattr(engine.pool, "checkedout"):
+        REGISTRY.add_callback(f"db_pool_{name}", lambda: {
+            "size": engine.pool.size(), "checked_out": engine.pool.checkedout(), "overflow": max(0, engine.pool.overflow()),
+        })
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул asyncpg с замером ожидания соединения: если гистограмма растёт,
+    пул мал для нагрузки (или соединения держат слишком долго). Метка db —
+    pool_logging_name движка."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, self._orig_logging_name or "default")
+
+# логгер пула назван по модулю класса (вне иерархии "sqlalchemy"): без этого он
+# пишет INFO о dispose/recreate, как только корневой логгер на уровне INFO
+logging.getLogger(f"{__name__}.TimedQueuePool").setLevel(logging.WARNING)
+
+# --- профайлер ---
+
+profiler = SamplingProfiler()
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy import (
+    JSON, BigInteger, Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    func, inspect, insert, select, text,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .db import MIGRATE_LOCK_ID, AsyncSessionLocal, engine, sync_metadata
+
+log = logging.getLogger(__name__)
+
+# Миграции — отдельной командой перед запуском воркеров API:
+#   python -m app.migrate             миграции + сидирование seed_content.json
+#   python -m app.migrate --check     код возврата 1, если база отстаёт
+# Воркеры при старте только сверяют версию (pending_migrations), DDL не делают.
+# Новая миграция — новая запись в конец MIGRATIONS, старые не меняются.
+# DDL каждой миграции записан здесь же, на момент её появления, без ссылок на
+# models.py: правка моделей требует новой миграции и не меняет уже выпущенные.
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    run: Callable[[AsyncConnection], Awaitable[None]]
+
+# 1: схема, которую до миграций создавал on_startup. Базы того времени могли
+# отставать на любое число правок, поэтому догоняем как раньше: create_all,
+# недостающие колонки, BIGINT, индексы (db.sync_metadata).
+_v1 = MetaData()
+Table(
+    "users", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("telegram_id", BigInteger, nullable=False, unique=True, index=True),
+    Column("username", String(64)),
+    Column("first_name", String(64)),
+    Column("last_name", String(64)),
+    Column("created_at", DateTime, nullable=False),
+)
+Table(
+    "leads", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("lead_type", String(32), nullable=False),
+    Column("name", String(120)),
+    Column("phone", String(64)),
+    Column("city", String(64)),
+    Column("work_type", String(120)),
+    Column("budget", String(64)),
+    Column("description", Text),
+    Column("status", String(32), nullable=False),
+    Column("version", Integer, nullable=False, server_default="1"),
+    Column("idempotency_key", String(64)),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_leads_created_at_id", "created_at", "id"),
+    Index("ix_leads_status_created_at_id", "status", "created_at", "id"),
+    Index("ix_leads_lead_type_created_at_id", "lead_type", "created_at", "id"),
+    Index("ix_leads_city_created_at_id", "city", "created_at", "id"),
+    Index("ux_leads_idempotency_key", "idempotency_key", unique=True),
+)
+Table(
+    "lead_attachments", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("lead_id", Integer, ForeignKey("leads.id"), nullable=False, index=True),
+    Column("file_id", String(256), nullable=False),
+    Column("file_type", String(32), nullable=False),
+)
+Table(
+    "lead_stats_daily", _v1,
+    Column("day", Date, primary_key=True),
+    Column("status", String(32), primary_key=True),
+    Column("lead_type", String(32), primary_key=True),
+    Column("city", String(64), primary_key=True),
+    Column("work_type", String(120), primary_key=True),
+    Column("count", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+Table(
+    "faq", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("question", Text, nullable=False),
+    Column("answer", Text, nullable=False),
+    Column("seed_key", String(64), unique=True, index=True),
+    Column("content_hash", String(64)),
+)
+Table(
+    "documents", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("title", String(200), nullable=False),
+    Column("path", String(300), nullable=False),
+    Column("seed_key", String(64), unique=True, index=True),
+    Column("content_hash", String(64)),
+)
+Table(
+    "projects", _v1,
+    Column("id", Integer, primary_key=True),
+    Column("title", String(200), nullable=False),
+    Column("description", Text, nullable=False),
+    Column("image", String(300)),
+    Column("seed_key", String(64), unique=True, index=True),
+    Column("content_hash", String(64)),
+)
+
+# поиск (search.py): генерируемые колонки и GIN-индексы, только Postgres
+_V1_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """ALTER TABLE leads ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(city, '') || ' ' || coalesce(work_type, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    ) STORED""",
+    r"""ALTER TABLE leads ADD COLUMN IF NOT EXISTS phone_digits text GENERATED ALWAYS AS (
+        regexp_replace(coalesce(phone, ''), '\D', '', 'g')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_leads_search_vector ON leads USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_phone_digits_trgm ON leads USING gin (phone_digits gin_trgm_ops)",
+]
+
+async def _baseline(conn: AsyncConnection) -> None:
+    await sync_metadata(conn, _v1)
+    if conn.dialect.name == "postgresql":
+        for ddl in _V1_SEARCH_DDL:
+            await conn.execute(text(ddl))
+
+async def _add_columns(conn: AsyncConnection, table: str, *columns: Column) -> None:
+    """ALTER TABLE ... ADD COLUMN для тех колонок, которых ещё нет: базы, поднятые
+    прежней baseline из текущих моделей, могут уже их иметь."""
+    existing = {c["name"] for c in await conn.run_sync(lambda c: inspect(c).get_columns(table))}
+    for column in columns:
+        if column.name in existing:
+            continue
+        ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+        await conn.execute(text(ddl))
+
+async def _attachment_metadata(conn: AsyncConnection) -> None:
+    await _add_columns(
+        conn, "lead_attachments",
+        Column("file_unique_id", String(64)),
+        Column("width", Integer),
+        Column("height", Integer),
+        Column("file_size", Integer),
+        Column("sizes", JSON),
+        Column("thumb_file_id", String(256)),
+        Column("thumb_sha256", String(64)),
+        Column("thumb_attempts", Integer, server_default="0"),
+        Column("thumb_next_at", DateTime),
+    )
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_lead_attachments_thumb_sha256 ON lead_attachments (thumb_sha256)"))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_lead_attachments_thumb_pending ON lead_attachments (thumb_next_at)"
+        " WHERE thumb_sha256 IS NULL AND thumb_file_id IS NOT NULL"
+    ))
+
+async def _backfill_lead_stats(conn: AsyncConnection) -> None:
+    from . import stats
+    async with AsyncSession(bind=conn) as session:
+        await stats.backfill_if_empty(session)
+
+_v4 = MetaData()
+Table(
+    "lead_idempotency_keys", _v4,
+    Column("key", String(64), primary_key=True),
+    Column("created_at", DateTime, nullable=False, index=True),
+)
+Table(
+    "leads_archive", _v4,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("user_id", Integer),
+    Column("lead_type", String(32), nullable=False),
+    Column("name", String(120)),
+    Column("phone", String(64)),
+    Column("city", String(64)),
+    Column("work_type", String(120)),
+    Column("budget", String(64)),
+    Column("description", Text),
+    Column("status", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("idempotency_key", String(64)),
+    Column("created_at", DateTime, nullable=False),
+    Column("attachments", JSON),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_leads_archive_created_at_id", "created_at", "id"),
+)
+
+# индексы leads и lead_attachments после миграции 4; в Postgres перестройка
+# в секционированные таблицы их теряет, и они создаются заново на родителях
+_V4_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_leads_created_at_id ON leads (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_status_created_at_id ON leads (status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_lead_type_created_at_id ON leads (lead_type, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_city_created_at_id ON leads (city, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_idempotency_key ON leads (idempotency_key)",
+    "CREATE INDEX IF NOT EXISTS ix_lead_attachments_lead_id ON lead_attachments (lead_id)",
+    "CREATE INDEX IF NOT EXISTS ix_lead_attachments_thumb_sha256 ON lead_attachments (thumb_sha256)",
+    "CREATE INDEX IF NOT EXISTS ix_lead_attachments_thumb_pending ON lead_attachments (thumb_next_at)"
+    " WHERE thumb_sha256 IS NULL AND thumb_file_id IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_leads_archive_created_at_id ON leads_archive (created_at, id)",
+]
+
+async def _partition_leads(conn: AsyncConnection) -> None:
+    from . import partitions
+    # уникальность idempotency_key переезжает в lead_idempotency_keys
+    await conn.execute(text("DROP INDEX IF EXISTS ux_leads_idempotency_key"))
+    await conn.run_sync(_v4.create_all)
+    await _add_columns(conn, "lead_attachments", Column("lead_created_at", DateTime))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_idempotency_key ON leads (idempotency_key)"))
+    await conn.execute(text(
+        "UPDATE lead_attachments SET lead_created_at = (SELECT created_at FROM leads WHERE leads.id = lead_attachments.lead_id)"
+        " WHERE lead_created_at IS NULL"
+    ))
+    await conn.execute(text(
+        "INSERT INTO lead_idempotency_keys (key, created_at)"
+        " SELECT idempotency_key, max(created_at) FROM leads WHERE idempotency_key IS NOT NULL GROUP BY idempotency_key"
+    ))
+    if conn.dialect.name == "postgresql":
+        await partitions.partition_tables(conn)
+        # генерируемые колонки поиска переносит LIKE ... INCLUDING GENERATED, индексы — нет
+        for ddl in _V4_INDEXES + [d for d in _V1_SEARCH_DDL if d.startswith("CREATE INDEX")]:
+            await conn.execute(text(ddl))
+
+MIGRATIONS: list[Migration] = [
+    # всё, что раньше делал on_startup: create_all, новые колонки, индексы, поиск
+    Migration(1, "baseline", _baseline),
+    Migration(2, "lead_stats_backfill", _backfill_lead_stats),
+    # метаданные фото и очередь миниатюр в lead_attachments
+    Migration(3, "attachment_metadata", _attachment_metadata),
+    # Postgres: leads/lead_attachments по месяцам, leads_archive по годам; ключи идемпотентности отдельно
+    Migration(4, "lead_partitioning", _partition_leads),
+]
+
+async def current_version(conn: AsyncConnection) -> int:
+    if not await conn.run_sync(lambda c: inspect(c).has_table(schema_migrations.name)):
+        return 0
+    return await conn.scalar(select(func.max(schema_migrations.c.version))) or 0
+
+async def pending_migrations(conn: AsyncConnection) -> list[Migration]:
+    version = await current_version(conn)
+    return [m for m in MIGRATIONS if m.version > version]
+
+async def apply_migrations() -> list[Migration]:
+    applied = []
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": MIGRATE_LOCK_ID})
+            await conn.commit()
+        try:
+            # список читаем под блокировкой: соседний процесс мог уже всё сделать
+            async with conn.begin():
+                await conn.run_sync(metadata.create_all)
+                pending = await pending_migrations(conn)
+            for migration in pending:
+                async with conn.begin():
+                    log.info("applying migration %s_%s", migration.version, migration.name)
+                    await migration.run(conn)
+                    await conn.execute(insert(schema_migrations).values(version=migration.version, name=migration.name))
+                applied.append(migration)
+        finally:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATE_LOCK_ID})
+                await conn.commit()
+    return applied
+
+async def migrate(seed_file: str | None = "seed_content.json") -> None:
+    from .seed import seed_from_file
+    applied = await apply_migrations()
+    log.info("schema at version %s (%s applied)", MIGRATIONS[-1].version, len(applied))
+    if seed_file:
+        async with AsyncSessionLocal() as session:
+            changed = await seed_from_file(session, seed_file)
+        log.info("seed: %s rows changed", changed)
+
+async def _main(args: argparse.Namespace) -> int:
+    try:
+        if args.check:
+            async with engine.connect() as conn:
+                pending = await pending_migrations(conn)
+            for m in pending:
+                print(f"pending: {m.version}_{m.name}")
+            return 1 if pending else 0
+        await migrate(None if args.no_seed else args.seed_file)
+        return 0
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(prog="python -m app.migrate")
+    parser.add_argument("--check", action="store_true", help="only report pending migrations")
+    parser.add_argument("--no-seed", action="store_true", help="skip seeding content")
+    parser.add_argument("--seed-file", default="seed_content.json")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
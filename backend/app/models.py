@@ -1,12 +1,12 @@
-from sqlalchemy import String, Text, Integer, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from datetime import datetime
+from sqlalchemy import JSON, String, Text, Integer, BigInteger, Date, DateTime, ForeignKey, Boolean, Index, select, func, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship, column_property
+from datetime import date, datetime
 from .db import Base
 
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    telegram_id: Mapped[int] = mapped_column(Integer, unique=True, index=True)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
     username: Mapped[str | None] = mapped_column(String(64), nullable=True)
     first_name: Mapped[str | None] = mapped_column(String(64), nullable=True)
     last_name: Mapped[str | None] = mapped_column(String(64), nullable=True)
@@ -16,6 +16,16 @@ class User(Base):
 
 class Lead(Base):
     __tablename__ = "leads"
+    # keyset-пагинация идёт по (created_at, id); под каждый фильтр админки — свой префикс
+    __table_args__ = (
+        Index("ix_leads_created_at_id", "created_at", "id"),
+        Index("ix_leads_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_leads_lead_type_created_at_id", "lead_type", "created_at", "id"),
+        Index("ix_leads_city_created_at_id", "city", "created_at", "id"),
+        # уникальность ключа держит lead_idempotency_keys: на секционированной
+        # таблице уникальный индекс обязан включать created_at
+        Index("ix_leads_idempotency_key", "idempotency_key"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
 
@@ -28,31 +38,114 @@ class Lead(Base):
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     status: Mapped[str] = mapped_column(String(32), default="new")  # new / in_progress / done / rejected
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")  # +1 на каждую смену статуса
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     user: Mapped["User"] = relationship(back_populates="leads")
     attachments: Mapped[list["LeadAttachment"]] = relationship(back_populates="lead", cascade="all, delete-orphan")
 
+_THUMB_PENDING = "thumb_sha256 IS NULL AND thumb_file_id IS NOT NULL"
+
 class LeadAttachment(Base):
     __tablename__ = "lead_attachments"
+    # очередь воркера миниатюр (thumbnails.py) — только строки без готовой миниатюры
+    __table_args__ = (
+        Index("ix_lead_attachments_thumb_pending", "thumb_next_at",
+              postgresql_where=text(_THUMB_PENDING), sqlite_where=text(_THUMB_PENDING)),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    lead_id: Mapped[int] = mapped_column(ForeignKey("leads.id"))
-    file_id: Mapped[str] = mapped_column(String(256))
+    lead_id: Mapped[int] = mapped_column(ForeignKey("leads.id"), index=True)
+    # created_at заявки — ключ секционирования (в Postgres секции по месяцам, как у leads)
+    lead_created_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    file_id: Mapped[str] = mapped_column(String(256))  # самый большой размер
     file_type: Mapped[str] = mapped_column(String(32), default="photo")
+    file_unique_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    width: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    height: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    file_size: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    sizes: Mapped[list | None] = mapped_column(JSON, nullable=True)  # все PhotoSize: file_id, width, height, file_size
+
+    thumb_file_id: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    thumb_sha256: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    thumb_attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    thumb_next_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     lead: Mapped["Lead"] = relationship(back_populates="attachments")
 
+# Счётчик вложений считается в том же SELECT, что и сама заявка (коррелированный
+# подзапрос по ix_lead_attachments_lead_id), без ленивой загрузки attachments.
+# Условие по lead_created_at отсекает все секции вложений, кроме одной.
+Lead.attachment_count = column_property(
+    select(func.count(LeadAttachment.id))
+    .where(LeadAttachment.lead_id == Lead.id, LeadAttachment.lead_created_at == Lead.created_at)
+    .correlate_except(LeadAttachment)
+    .scalar_subquery()
+)
+
+class LeadIdempotencyKey(Base):
+    """Ключи идемпотентности заявок (create_leads_batch); старые чистит архиватор."""
+    __tablename__ = "lead_idempotency_keys"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class LeadArchive(Base):
+    """Закрытые (done/rejected) заявки старше ARCHIVE_AFTER_DAYS, перенесённые из
+    leads архиватором (archive.py). Вложения — JSON-списком в той же строке,
+    индекс один; в Postgres таблица секционирована по годам."""
+    __tablename__ = "leads_archive"
+    __table_args__ = (
+        Index("ix_leads_archive_created_at_id", "created_at", "id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    lead_type: Mapped[str] = mapped_column(String(32))
+    name: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    phone: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    city: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    work_type: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    budget: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    description: Mapped[str | None] = mapped_column(Text, nullable=True)
+    status: Mapped[str] = mapped_column(String(32))
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    attachments: Mapped[list | None] = mapped_column(JSON, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    @property
+    def attachment_count(self) -> int:
+        return len(self.attachments or ())
+
+class LeadDailyStat(Base):
+    """Свёртка заявок по дням для /api/admin/stats; ведётся инкрементально в stats.py.
+    Пустые city/work_type хранятся как '' — столбцы входят в первичный ключ."""
+    __tablename__ = "lead_stats_daily"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    status: Mapped[str] = mapped_column(String(32), primary_key=True)
+    lead_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    city: Mapped[str] = mapped_column(String(64), primary_key=True, default="")
+    work_type: Mapped[str] = mapped_column(String(120), primary_key=True, default="")
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class FAQ(Base):
     __tablename__ = "faq"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     question: Mapped[str] = mapped_column(Text)
     answer: Mapped[str] = mapped_column(Text)
+    # строки из seed_content.json: позиция в файле и хэш содержимого (seed.py)
+    seed_key: Mapped[str | None] = mapped_column(String(64), nullable=True, unique=True, index=True)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
 class Document(Base):
     __tablename__ = "documents"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(200))
     path: Mapped[str] = mapped_column(String(300))  # relative path under /site/
+    # строки из seed_content.json: позиция в файле и хэш содержимого (seed.py)
+    seed_key: Mapped[str | None] = mapped_column(String(64), nullable=True, unique=True, index=True)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
 class Project(Base):
     __tablename__ = "projects"
@@ -60,3 +153,6 @@ class Project(Base):
     title: Mapped[str] = mapped_column(String(200))
     description: Mapped[str] = mapped_column(Text, default="")
     image: Mapped[str | None] = mapped_column(String(300), nullable=True)
+    # строки из seed_content.json: позиция в файле и хэш содержимого (seed.py)
+    seed_key: Mapped[str | None] = mapped_column(String(64), nullable=True, unique=True, index=True)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
@@ -0,0 +1,149 @@
+import logging
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+# Секционирование по диапазону (только Postgres). leads и lead_attachments —
+# по месяцам created_at заявки (у вложений — копия в lead_created_at), архив
+# leads_archive — по годам. Секции называются leads_p2024_05, leads_archive_y2024;
+# у каждой таблицы есть DEFAULT-секция, так что вставка не падает, даже если
+# секцию на месяц вперёд не успели создать. Новые секции заранее создаёт
+# архиватор (archive.py), исходную перестройку таблиц делает миграция 4.
+# В SQLite всё это не выполняется: таблицы обычные.
+
+MONTHLY = {"leads": "created_at", "lead_attachments": "lead_created_at"}
+YEARLY = {"leads_archive": "created_at"}
+
+# внешние ключи секционированных таблиц (на секционированную leads — только с ключом секционирования)
+FOREIGN_KEYS = {
+    "leads": ["FOREIGN KEY (user_id) REFERENCES users (id)"],
+    "lead_attachments": ["FOREIGN KEY (lead_id, lead_created_at) REFERENCES leads (id, created_at)"],
+}
+
+def month_floor(dt: datetime, shift: int = 0) -> datetime:
+    """Первое число месяца dt, сдвинутого на shift месяцев."""
+    index = dt.year * 12 + dt.month - 1 + shift
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def _monthly(parent: str, start: datetime) -> tuple[str, datetime, datetime]:
+    return f"{parent}_p{start:%Y_%m}", start, month_floor(start, 1)
+
+def _yearly(parent: str, year: int) -> tuple[str, datetime, datetime]:
+    return f"{parent}_y{year}", datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(await conn.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid"
+        " WHERE c.relname = :t AND pg_table_is_visible(c.oid))"
+    ), {"t": table}))
+
+async def create_partition(conn: AsyncConnection, parent: str, name: str, start: datetime, end: datetime) -> bool:
+    """CREATE TABLE ... PARTITION OF; False — секция уже есть или не создалась."""
+    if await conn.scalar(text("SELECT to_regclass(:n)"), {"n": name}) is not None:
+        return False
+    try:
+        # в точке сохранения: ошибка (гонка с соседним процессом, строки этого
+        # диапазона уже лежат в DEFAULT-секции) не ломает внешнюю транзакцию
+        async with conn.begin_nested():
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent}"
+                f" FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            ))
+    except DBAPIError as e:
+        log.warning("partition %s not created: %s", name, e.orig)
+        return False
+    log.info("created partition %s", name)
+    return True
+
+async def ensure_partitions(
+    conn: AsyncConnection, now: datetime | None = None, months_ahead: int | None = None,
+) -> list[str]:
+    """Месячные секции leads и lead_attachments с текущего месяца на months_ahead вперёд."""
+    now = now or datetime.utcnow()
+    months_ahead = settings.partition_months_ahead if months_ahead is None else months_ahead
+    created = []
+    for parent in MONTHLY:
+        if not await is_partitioned(conn, parent):
+            continue
+        for shift in range(months_ahead + 1):
+            name, start, end = _monthly(parent, month_floor(now, shift))
+            if await create_partition(conn, parent, name, start, end):
+                created.append(name)
+    return created
+
+async def ensure_archive_partitions(conn: AsyncConnection, years: Iterable[int]) -> list[str]:
+    created = []
+    for parent in YEARLY:
+        if not await is_partitioned(conn, parent):
+            continue
+        for year in sorted(set(years)):
+            name, start, end = _yearly(parent, year)
+            if await create_partition(conn, parent, name, start, end):
+                created.append(name)
+    return created
+
+async def _plain_columns(conn: AsyncConnection, table: str) -> list[str]:
+    # генерируемые колонки (search_vector, phone_digits) при копировании пересчитываются сами
+    res = await conn.execute(text(
+        "SELECT column_name FROM information_schema.columns"
+        " WHERE table_schema = current_schema() AND table_name = :t AND is_generated = 'NEVER'"
+        " ORDER BY ordinal_position"
+    ), {"t": table})
+    return [row[0] for row in res]
+
+async def _convert(conn: AsyncConnection, table: str, key: str, monthly: bool) -> None:
+    """Пересоздать обычную таблицу секционированной: те же колонки, умолчания
+    и последовательность id; PK (id, key); данные копируются одним INSERT ... SELECT.
+    Индексы потом создаёт заново миграция 4 — уже на родителе."""
+    old = f"{table}_unpartitioned"
+    await conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    # имена индексов общие на схему — старые освобождают их для новой таблицы
+    res = await conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": old})
+    for (index,) in res.all():
+        await conn.execute(text(f"ALTER INDEX {index} RENAME TO {index[:50]}_unpart"))
+    await conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED)"
+        f" PARTITION BY RANGE ({key})"
+    ))
+    await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {key})"))
+
+    now = datetime.utcnow()
+    oldest = await conn.scalar(text(f"SELECT min({key}) FROM {old}")) or now
+    if monthly:
+        start = month_floor(oldest)
+        while start <= month_floor(now, settings.partition_months_ahead):
+            await create_partition(conn, table, *_monthly(table, start))
+            start = month_floor(start, 1)
+    else:
+        for year in range(oldest.year, now.year + 1):
+            await create_partition(conn, table, *_yearly(table, year))
+    await conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    columns = ", ".join(await _plain_columns(conn, old))
+    await conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}"))
+    seq = await conn.scalar(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": old})
+    if seq:
+        await conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {table}.id"))
+    await conn.execute(text(f"DROP TABLE {old} CASCADE"))
+    # после DROP: ограничения получают те же имена, что были у старой таблицы
+    for fk in FOREIGN_KEYS.get(table, ()):
+        await conn.execute(text(f"ALTER TABLE {table} ADD {fk}"))
+
+async def partition_tables(conn: AsyncConnection) -> None:
+    """Миграция: leads, lead_attachments, leads_archive -> секционированные (повторно не трогает)."""
+    # сначала leads: DROP старой leads снимает ссылку со старых вложений
+    for table, key in MONTHLY.items():
+        if not await is_partitioned(conn, table):
+            await _convert(conn, table, key, monthly=True)
+    for table, key in YEARLY.items():
+        if not await is_partitioned(conn, table):
+            await _convert(conn, table, key, monthly=False)
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Union
+from datetime import datetime
 
 class TGUser(BaseModel):
     id: int
@@ -23,6 +24,18 @@ class ProjectOut(BaseModel):
     description: str
     image: Optional[str] = None
 
+class PhotoSizeIn(BaseModel):
+    file_id: str = Field(max_length=256)
+    file_unique_id: Optional[str] = Field(default=None, max_length=64)
+    width: Optional[int] = None
+    height: Optional[int] = None
+    file_size: Optional[int] = None
+
+class AttachmentIn(PhotoSizeIn):
+    # file_id и размеры — самого большого варианта; sizes — все варианты Telegram PhotoSize
+    file_type: str = "photo"
+    sizes: List[PhotoSizeIn] = Field(default_factory=list, max_length=10)
+
 class LeadCreate(BaseModel):
     lead_type: str
     name: Optional[str] = None
@@ -31,7 +44,11 @@ class LeadCreate(BaseModel):
     work_type: Optional[str] = None
     budget: Optional[str] = None
     description: Optional[str] = None
-    attachments: Optional[List[str]] = None  # Telegram file_id list
+    attachments: Optional[List[Union[AttachmentIn, str]]] = None  # photo metadata or bare Telegram file_id
+    idempotency_key: Optional[str] = Field(default=None, min_length=8, max_length=64)  # client-generated, e.g. uuid4
+
+class LeadBatchIn(BaseModel):
+    leads: List[LeadCreate] = Field(min_length=1, max_length=500)
 
 class LeadOut(BaseModel):
     id: int
@@ -43,8 +60,76 @@ class LeadOut(BaseModel):
     budget: Optional[str]
     description: Optional[str]
     status: str
-    created_at: str
+    version: int
+    created_at: datetime
     attachment_count: int
 
+class AttachmentOut(BaseModel):
+    id: int
+    file_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    file_size: Optional[int] = None
+    thumb_url: Optional[str] = None  # None, пока миниатюра не скачана
+
+class LeadPage(BaseModel):
+    items: List[LeadOut]
+    next_cursor: Optional[str] = None
+
 class LeadStatusUpdate(BaseModel):
     status: str
+    version: Optional[int] = None  # если передан — 409 при расхождении
+
+class LeadRef(BaseModel):
+    id: int
+    version: Optional[int] = None
+
+class LeadFilter(BaseModel):
+    status: Optional[str] = None
+    lead_type: Optional[str] = None
+    city: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+# не больше заявок за один PATCH /api/admin/leads — и списком, и по фильтру
+BULK_MAX_LEADS = 1000
+
+class LeadBulkStatusUpdate(BaseModel):
+    status: str
+    leads: Optional[List[LeadRef]] = Field(default=None, min_length=1, max_length=BULK_MAX_LEADS)
+    filter: Optional[LeadFilter] = None
+
+    @model_validator(mode="after")
+    def _one_target(self):
+        if (self.leads is None) == (self.filter is None):
+            raise ValueError("pass either leads or filter")
+        if self.filter is not None and not any(v is not None for v in self.filter.model_dump().values()):
+            raise ValueError("filter: set at least one field")
+        return self
+
+class LeadConflict(BaseModel):
+    id: int
+    reason: str  # not_found / unchanged / invalid_transition / version_conflict
+    status: Optional[str] = None
+    version: Optional[int] = None
+
+class LeadBulkResult(BaseModel):
+    updated: List[LeadOut]
+    conflicts: List[LeadConflict]
+    # по фильтру обновлено BULK_MAX_LEADS — могли остаться ещё: повторите тот же запрос
+    # (обновлённые уже в целевом статусе и под фильтр больше не попадут)
+    has_more: bool = False
+
+class StatsRow(BaseModel):
+    day: Optional[str] = None
+    status: Optional[str] = None
+    lead_type: Optional[str] = None
+    city: Optional[str] = None
+    work_type: Optional[str] = None
+    count: int
+
+class StatsOut(BaseModel):
+    group_by: List[str]
+    rows: List[StatsRow]
+    total: int
+    as_of: Optional[str] = None  # last rollup update (UTC)
@@ -0,0 +1,90 @@
+import base64
+import re
+from sqlalchemy import Float, case, cast, desc, func, literal_column, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Lead
+
+# Поиск по заявкам. В Postgres — генерируемые колонки leads.search_vector
+# (tsvector, russian) и leads.phone_digits (только цифры телефона, pg_trgm),
+# обе с GIN-индексами; создаются миграцией 1 (migrate.py). В других СУБД — LIKE.
+
+SEARCH_CONFIG = "russian"
+MIN_PHONE_DIGITS = 4
+# без regexp_replace (SQLite) цифры телефона получаем, вырезая эти символы
+PHONE_SEPARATORS = " -()+./"
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""ALTER TABLE leads ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(city, '') || ' ' || coalesce(work_type, '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')
+    ) STORED""",
+    r"""ALTER TABLE leads ADD COLUMN IF NOT EXISTS phone_digits text GENERATED ALWAYS AS (
+        regexp_replace(coalesce(phone, ''), '\D', '', 'g')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_leads_search_vector ON leads USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_leads_phone_digits_trgm ON leads USING gin (phone_digits gin_trgm_ops)",
+]
+
+def encode_cursor(rank: float, lead_id: int) -> str:
+    raw = f"{rank!r}|{lead_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        rank, lead_id = raw.split("|", 1)
+        return float(rank), int(lead_id)
+    except Exception as e:
+        raise ValueError("Bad cursor") from e
+
+def _digits(q: str) -> str:
+    return re.sub(r"\D", "", q)
+
+def _postgres_match(q: str):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    vector = literal_column("leads.search_vector")
+    rank = func.ts_rank_cd(vector, tsquery)
+    conds = [vector.op("@@")(tsquery)]
+    digits = _digits(q)
+    if len(digits) >= MIN_PHONE_DIGITS:
+        phone_hit = literal_column("leads.phone_digits").like(f"%{digits}%")
+        conds.append(phone_hit)
+        # совпадение по телефону важнее любого текстового
+        rank = rank + case((phone_hit, 1.0), else_=0.0)
+    return or_(*conds), cast(rank, Float)
+
+def _fallback_phone_digits():
+    expr = func.coalesce(Lead.phone, "")
+    for ch in PHONE_SEPARATORS:
+        expr = func.replace(expr, ch, "")
+    return expr
+
+def _fallback_match(q: str):
+    pattern = f"%{q}%"
+    conds = [col.ilike(pattern) for col in (Lead.name, Lead.phone, Lead.city, Lead.work_type, Lead.description)]
+    digits = _digits(q)
+    if len(digits) >= MIN_PHONE_DIGITS:
+        # «9123456» находит «+7 (912) 345-67-89», как phone_digits в Postgres
+        conds.append(_fallback_phone_digits().like(f"%{digits}%"))
+    return or_(*conds), cast(0.0, Float)
+
+async def search_leads(
+    session: AsyncSession,
+    q: str,
+    limit: int = 50,
+    after: tuple[float, int] | None = None,
+    conditions: list | None = None,
+) -> list[tuple[Lead, float]]:
+    if session.bind.dialect.name == "postgresql":
+        match, rank = _postgres_match(q)
+    else:
+        match, rank = _fallback_match(q)
+    stmt = select(Lead, rank.label("rank")).where(match, *(conditions or []))
+    if after is not None:
+        stmt = stmt.where(tuple_(rank, Lead.id) < tuple_(*after))
+    stmt = stmt.order_by(desc(rank), desc(Lead.id)).limit(limit)
+    res = await session.execute(stmt)
+    return [(lead, float(r)) for lead, r in res.all()]
@@ -1,24 +1,69 @@
+import hashlib
 import json
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, delete, update, text
 from sqlalchemy.ext.asyncio import AsyncSession
+from .crud import _insert
+from .db import SEED_LOCK_ID
 from .models import FAQ, Document, Project
+from .content_cache import content_cache
 
-async def seed_from_file(session: AsyncSession, seed_file: str = "seed_content.json") -> None:
-    with open(seed_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+# Синхронизация контента с seed_content.json. Строка файла определяется
+# позицией (seed_key), изменения — по content_hash: неизменённые строки не
+# трогаются, правки и удаления в файле применяются. Строки, добавленные не из
+# файла (seed_key IS NULL), не удаляются.
+
+SECTIONS = {
+    "faq": (FAQ, lambda item: {"question": item["question"], "answer": item["answer"]}),
+    "documents": (Document, lambda item: {"title": item["title"], "path": item["path"]}),
+    "projects": (Project, lambda item: {
+        "title": item["title"],
+        "description": item.get("description", ""),
+        "image": item.get("image"),
+    }),
+}
+
+def content_hash(values: dict) -> str:
+    raw = json.dumps(values, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
 
-    # Only seed if empty
-    faq_count = await session.scalar(select(func.count()).select_from(FAQ))
-    if faq_count and faq_count > 0:
+async def _adopt_legacy_rows(session: AsyncSession, model, count: int) -> None:
+    # базы, засеянные до seed_key: сопоставляем старые строки с файлом по порядку id
+    if await session.scalar(select(model.id).where(model.seed_key.is_not(None)).limit(1)) is not None:
         return
+    ids = (await session.scalars(select(model.id).order_by(model.id).limit(count))).all()
+    if ids:
+        await session.execute(update(model), [{"id": i, "seed_key": str(n)} for n, i in enumerate(ids)])
 
-    for item in data.get("faq", []):
-        session.add(FAQ(question=item["question"], answer=item["answer"]))
+async def _sync_section(session: AsyncSession, model, items: list[dict]) -> int:
+    await _adopt_legacy_rows(session, model, len(items))
+    rows = [{**values, "seed_key": str(n), "content_hash": content_hash(values)} for n, values in enumerate(items)]
+    changed = 0
+    if rows:
+        # один многострочный INSERT ... ON CONFLICT (seed_key) DO UPDATE только для изменённых
+        stmt = _insert(session, model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.seed_key],
+            set_={c: stmt.excluded[c] for c in rows[0] if c != "seed_key"},
+            where=model.content_hash.is_distinct_from(stmt.excluded.content_hash),
+        ).returning(model.id)
+        changed += len((await session.execute(stmt)).all())
+    res = await session.execute(
+        delete(model).where(model.seed_key.is_not(None), model.seed_key.not_in([r["seed_key"] for r in rows]))
+    )
+    return changed + (res.rowcount or 0)
+
+async def seed_from_file(session: AsyncSession, seed_file: str = "seed_content.json") -> int:
+    with open(seed_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
 
-    for item in data.get("documents", []):
-        session.add(Document(title=item["title"], path=item["path"]))
+    if session.bind.dialect.name == "postgresql":
+        await session.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": SEED_LOCK_ID})
 
-    for item in data.get("projects", []):
-        session.add(Project(title=item["title"], description=item.get("description",""), image=item.get("image")))
+    changed = 0
+    for section, (model, to_values) in SECTIONS.items():
+        changed += await _sync_section(session, model, [to_values(item) for item in data.get(section, [])])
 
     await session.commit()
+    if changed:
+        content_cache.invalidate()
+    return changed
@@ -0,0 +1,21 @@
+import operator
+
+from .models import Lead
+from .schemas import LeadOut
+
+# Ответы с заявками отдаются как ORJSONResponse(...) из готовых dict: FastAPI не
+# валидирует их повторно по response_model (он остаётся только для OpenAPI),
+# а orjson кодирует сразу в байты, datetime — в ISO-строку, как в LeadOut.
+# Ключи берутся из самой схемы, так что ответ и OpenAPI не разъедутся.
+
+LEAD_FIELDS = tuple(LeadOut.model_fields)
+_lead_values = operator.itemgetter(*LEAD_FIELDS)
+
+def lead_to_dict(lead: Lead) -> dict:
+    # значения прямо из __dict__ экземпляра, мимо дескрипторов ORM
+    try:
+        values = _lead_values(lead.__dict__)
+    except KeyError:
+        # какой-то атрибут не загружен — обычный доступ через ORM
+        values = tuple(getattr(lead, name) for name in LEAD_FIELDS)
+    return dict(zip(LEAD_FIELDS, values))
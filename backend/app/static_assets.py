@@ -0,0 +1,269 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import sys
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+import anyio
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость, тогда только gzip
+    brotli = None
+
+# Сборка: python -m app.static_assets build [static] [build/static]
+# css/js получают копию с хэшем в имени (ссылки в html переписываются),
+# текстовые файлы — рядом лежащие .gz/.br. Рантайм ниже отдаёт готовые варианты.
+
+SOURCE_DIR = "static"
+BUILD_DIR = "build/static"
+MANIFEST = ".asset-manifest.json"
+FINGERPRINT_EXT = {".css", ".js"}
+COMPRESS_EXT = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml", ".ico", ".webmanifest", ".map"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+RANGE_CHUNK = 64 * 1024
+
+_REF_RE = re.compile(r'''(?P<attr>\b(?:src|href)=)(?P<q>["'])(?P<ref>[^"'#?]+)(?P=q)''')
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+def _walk(root: str):
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            yield full, os.path.relpath(full, root).replace(os.sep, "/")
+
+def _resolve(page_url: str, ref: str) -> Optional[str]:
+    if "://" in ref or ref.startswith(("//", "data:", "mailto:", "tel:")):
+        return None
+    if ref.startswith("/"):
+        return posixpath.normpath(ref)
+    return posixpath.normpath(posixpath.join(posixpath.dirname(page_url), ref))
+
+def build(src: str = SOURCE_DIR, out: str = BUILD_DIR) -> dict:
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    shutil.copytree(src, out)
+
+    # 1) отпечатки для css/js: /site/css/styles.css -> styles.<hash>.css
+    hashed: dict[str, str] = {}
+    for full, rel in list(_walk(out)):
+        stem, ext = os.path.splitext(full)
+        if ext not in FINGERPRINT_EXT:
+            continue
+        with open(full, "rb") as f:
+            data = f.read()
+        target = f"{stem}.{_digest(data)}{ext}"
+        shutil.copyfile(full, target)
+        hashed["/" + rel] = os.path.basename(target)
+
+    # 2) ссылки в html на хэшированные имена
+    for full, rel in _walk(out):
+        if not rel.endswith(".html"):
+            continue
+        with open(full, "r", encoding="utf-8") as f:
+            html = f.read()
+
+        def _swap(m: re.Match) -> str:
+            ref = m.group("ref")
+            url = _resolve("/" + rel, ref)
+            if url not in hashed:
+                return m.group(0)
+            new_ref = ref[: ref.rfind("/") + 1] + hashed[url]
+            return f"{m.group('attr')}{m.group('q')}{new_ref}{m.group('q')}"
+
+        rewritten = _REF_RE.sub(_swap, html)
+        if rewritten != html:
+            with open(full, "w", encoding="utf-8") as f:
+                f.write(rewritten)
+
+    # 3) предсжатые варианты; оставляем, только если реально меньше
+    for full, rel in list(_walk(out)):
+        if os.path.splitext(full)[1] not in COMPRESS_EXT:
+            continue
+        with open(full, "rb") as f:
+            data = f.read()
+        variants = [(".gz", gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, packed in variants:
+            if len(packed) < len(data) * 0.9:
+                with open(full + suffix, "wb") as f:
+                    f.write(packed)
+
+    immutable = {}
+    for url, name in hashed.items():
+        mount, _, rel = url.lstrip("/").partition("/")
+        immutable.setdefault(mount, []).append(posixpath.join(posixpath.dirname(rel), name))
+    with open(os.path.join(out, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"immutable": immutable}, f, ensure_ascii=False, indent=1)
+    return hashed
+
+def asset_dir(mount: str) -> str:
+    built = os.path.join(BUILD_DIR, mount)
+    return built if os.path.isdir(built) else os.path.join(SOURCE_DIR, mount)
+
+@dataclass
+class _Asset:
+    path: str
+    stat: os.stat_result
+    media_type: str
+    etag: str
+    immutable: bool
+    variants: dict[str, tuple[str, os.stat_result]] = field(default_factory=dict)
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() not in (coding, "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    # поддерживаем один диапазон: bytes=a-b, bytes=a-, bytes=-n
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    if start_s:
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    else:
+        length = int(end_s)
+        if length <= 0:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - length), size - 1
+    end = min(end, size - 1)
+    if start > end:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+async def _read_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(RANGE_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles с индексом файлов в памяти: br/gzip по Accept-Encoding,
+    immutable-кэш для хэшированных имён, ETag/304 и Range для остального."""
+
+    def __init__(self, *, directory: str, html: bool = False, manifest_key: Optional[str] = None):
+        super().__init__(directory=directory, html=html)
+        self.manifest_key = manifest_key or os.path.basename(os.path.normpath(directory))
+        self.assets = self._build_index(directory)
+
+    def _build_index(self, directory: str) -> dict[str, _Asset]:
+        immutable: set[str] = set()
+        manifest_path = os.path.join(os.path.dirname(os.path.normpath(directory)), MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                immutable = set(json.load(f).get("immutable", {}).get(self.manifest_key, []))
+
+        assets: dict[str, _Asset] = {}
+        for full, rel in _walk(directory):
+            if rel.endswith((".gz", ".br")):
+                continue
+            st = os.stat(full)
+            asset = _Asset(
+                path=full,
+                stat=st,
+                media_type=mimetypes.guess_type(full)[0] or "application/octet-stream",
+                etag=f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+                immutable=rel in immutable,
+            )
+            for coding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if os.path.exists(full + suffix):
+                    asset.variants[coding] = (full + suffix, os.stat(full + suffix))
+            assets[rel] = asset
+        return assets
+
+    def _lookup(self, path: str) -> tuple[Optional[_Asset], int]:
+        key = "" if path == "." else path.replace(os.sep, "/")
+        asset = self.assets.get(key)
+        if asset is not None:
+            return asset, 200
+        if self.html:
+            index = self.assets.get(posixpath.join(key, "index.html") if key else "index.html")
+            if index is not None:
+                return index, 200
+            not_found = self.assets.get("404.html")
+            if not_found is not None:
+                return not_found, 404
+        return None, 404
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+        asset, status = self._lookup(path)
+        if asset is None:
+            raise HTTPException(status_code=404)
+
+        req_headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        headers = {
+            "etag": asset.etag,
+            "cache-control": IMMUTABLE if asset.immutable else REVALIDATE,
+        }
+        if asset.variants:
+            headers["vary"] = "Accept-Encoding"
+
+        if status == 200 and asset.etag in [t.strip().removeprefix("W/") for t in req_headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        accept = req_headers.get("accept-encoding", "")
+        for coding in ("br", "gzip"):
+            if coding in asset.variants and _accepts(accept, coding):
+                variant_path, variant_stat = asset.variants[coding]
+                headers["content-encoding"] = coding
+                headers["accept-ranges"] = "none"
+                return FileResponse(variant_path, status_code=status, headers=headers,
+                                    media_type=asset.media_type, stat_result=variant_stat)
+
+        range_header = req_headers.get("range")
+        if range_header and status == 200:
+            size = asset.stat.st_size
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+            if byte_range is not None:
+                start, end = byte_range
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+                headers["content-length"] = str(end - start + 1)
+                headers["accept-ranges"] = "bytes"
+                return StreamingResponse(_read_range(asset.path, start, end), status_code=206,
+                                         headers=headers, media_type=asset.media_type)
+
+        return FileResponse(asset.path, status_code=status, headers=headers,
+                            media_type=asset.media_type, stat_result=asset.stat)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        sys.exit("usage: python -m app.static_assets build [src] [out]")
+    result = build(*sys.argv[2:4])
+    for url, name in sorted(result.items()):
+        print(f"{url} -> {name}")
@@ -0,0 +1,108 @@
+from collections import Counter
+from datetime import date, datetime
+from sqlalchemy import delete, func, inspect, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Lead, LeadArchive, LeadDailyStat
+
+# Аналитика по заявкам читается только из свёртки lead_stats_daily.
+# Свёртка меняется в той же транзакции, что и сами заявки (создание, смена
+# статуса), поэтому всегда согласована с leads; полный GROUP BY по leads
+# делается один раз — при первом запуске на уже наполненной базе.
+
+DIMENSIONS = ("day", "status", "lead_type", "city", "work_type")
+
+StatKey = tuple[date, str, str, str, str]
+
+def stat_key(created_at: datetime, status: str, lead_type: str, city: str | None, work_type: str | None) -> StatKey:
+    return created_at.date(), status, lead_type, city or "", work_type or ""
+
+def lead_key(lead: Lead, status: str | None = None) -> StatKey:
+    return stat_key(lead.created_at, status or lead.status, lead.lead_type, lead.city, lead.work_type)
+
+def _upsert(session: AsyncSession):
+    insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(LeadDailyStat)
+    return stmt.on_conflict_do_update(
+        index_elements=[getattr(LeadDailyStat, d) for d in DIMENSIONS],
+        set_={
+            "count": LeadDailyStat.count + stmt.excluded.count,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+async def apply(session: AsyncSession, deltas: Counter) -> None:
+    """Прибавить deltas (ключ -> +n/-n) к свёртке. Коммит — на вызывающей стороне."""
+    now = datetime.utcnow()
+    rows = [
+        dict(zip(DIMENSIONS, key), count=n, updated_at=now)
+        for key, n in sorted(deltas.items()) if n
+    ]
+    if rows:
+        # сортировка ключей — одинаковый порядок блокировок у параллельных транзакций
+        await session.execute(_upsert(session), rows)
+
+async def rebuild(session: AsyncSession) -> int:
+    """Пересчитать свёртку целиком по leads и leads_archive (одна агрегирующая вставка)."""
+    await session.execute(delete(LeadDailyStat))
+    # архивные заявки в статистике остаются (до миграции 4 таблицы архива ещё нет)
+    models = [Lead]
+    if await session.run_sync(lambda s: inspect(s.connection()).has_table(LeadArchive.__tablename__)):
+        models.append(LeadArchive)
+    rows = union_all(*(
+        select(m.created_at, m.status, m.lead_type, m.city, m.work_type) for m in models
+    )).subquery()
+    day = func.date(rows.c.created_at)
+    city = func.coalesce(rows.c.city, "")
+    work_type = func.coalesce(rows.c.work_type, "")
+    source = (
+        select(day, rows.c.status, rows.c.lead_type, city, work_type, func.count(), literal(datetime.utcnow()))
+        .group_by(day, rows.c.status, rows.c.lead_type, city, work_type)
+    )
+    await session.execute(
+        LeadDailyStat.__table__.insert().from_select([*DIMENSIONS, "count", "updated_at"], source)
+    )
+    await session.commit()
+    return await session.scalar(select(func.count()).select_from(LeadDailyStat)) or 0
+
+async def backfill_if_empty(session: AsyncSession) -> None:
+    if await session.scalar(select(LeadDailyStat.day).limit(1)) is not None:
+        return
+    if await session.scalar(select(Lead.id).limit(1)) is None:
+        return
+    await rebuild(session)
+
+async def query(
+    session: AsyncSession,
+    group_by: list[str],
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: str | None = None,
+    lead_type: str | None = None,
+    city: str | None = None,
+) -> tuple[list[dict], datetime | None]:
+    cols = [getattr(LeadDailyStat, d) for d in group_by]
+    stmt = select(*cols, func.sum(LeadDailyStat.count), func.max(LeadDailyStat.updated_at))
+    if date_from:
+        stmt = stmt.where(LeadDailyStat.day >= date_from)
+    if date_to:
+        stmt = stmt.where(LeadDailyStat.day < date_to)
+    if status:
+        stmt = stmt.where(LeadDailyStat.status == status)
+    if lead_type:
+        stmt = stmt.where(LeadDailyStat.lead_type == lead_type)
+    if city:
+        stmt = stmt.where(LeadDailyStat.city == city)
+    stmt = stmt.group_by(*cols).having(func.sum(LeadDailyStat.count) != 0).order_by(*cols)
+
+    rows, as_of = [], None
+    for *values, count, updated_at in (await session.execute(stmt)).all():
+        row = {d: (v if v != "" else None) for d, v in zip(group_by, values)}
+        if "day" in row:
+            row["day"] = row["day"].isoformat()
+        row["count"] = int(count)
+        rows.append(row)
+        if updated_at is not None and (as_of is None or updated_at > as_of):
+            as_of = updated_at
+    return rows, as_of
@@ -1,20 +1,66 @@
 import hmac
 import hashlib
+import time
 import urllib.parse
 import json
+from collections import OrderedDict
 from typing import Optional
 from .config import settings
+from .metrics import INIT_DATA_LATENCY
 
 class TelegramAuthError(Exception):
     pass
 
+# ключ зависит только от токена — считаем один раз
+_SECRET_KEY = hashlib.sha256(settings.bot_token.encode("utf-8")).digest()
+
+class _VerifiedCache:
+    # LRU проверенных initData: WebApp шлёт один и тот же заголовок на каждый запрос
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+    def get(self, key: bytes, now: float) -> Optional[dict]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, data = item
+        if expires_at <= now:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return data
+
+    def put(self, key: bytes, data: dict, expires_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+        self._items[key] = (expires_at, data)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+_cache = _VerifiedCache(settings.init_data_cache_size, settings.init_data_cache_ttl)
+
 def _parse_init_data(init_data: str) -> dict:
     # init_data is querystring-like: key=value&key2=value2...
     parsed = urllib.parse.parse_qs(init_data, strict_parsing=True)
     data = {k: v[0] for k, v in parsed.items()}
     return data
 
-def verify_init_data(init_data: str) -> dict:
+def _auth_expires_at(data: dict) -> float:
+    if settings.init_data_max_age <= 0:
+        return float("inf")
+    try:
+        auth_date = int(data["auth_date"])
+    except (KeyError, ValueError) as e:
+        raise TelegramAuthError("No auth_date in initData") from e
+    return auth_date + settings.init_data_max_age
+
+def _verify_uncached(init_data: str) -> dict:
     try:
         data = _parse_init_data(init_data)
     except Exception as e:
@@ -28,8 +74,7 @@ def verify_init_data(init_data: str) -> dict:
     pairs = [f"{k}={data[k]}" for k in sorted(data.keys())]
     data_check_string = "\n".join(pairs)
 
-    secret_key = hashlib.sha256(settings.bot_token.encode("utf-8")).digest()
-    calculated_hash = hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    calculated_hash = hmac.new(_SECRET_KEY, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
 
     if not hmac.compare_digest(calculated_hash, received_hash):
         raise TelegramAuthError("Invalid initData hash")
@@ -42,6 +87,27 @@ def verify_init_data(init_data: str) -> dict:
 
     return data
 
+def verify_init_data(init_data: str) -> dict:
+    start = time.perf_counter()
+    result = "hit"
+    try:
+        now = time.time()
+        key = hashlib.sha256(init_data.encode("utf-8")).digest()
+        data = _cache.get(key, now)
+        if data is None:
+            result = "miss"
+            data = _verify_uncached(init_data)
+            expires_at = _auth_expires_at(data)
+            if expires_at <= now:
+                raise TelegramAuthError("initData expired")
+            _cache.put(key, data, min(now + _cache.ttl, expires_at))
+        return dict(data)
+    except TelegramAuthError:
+        result = "invalid"
+        raise
+    finally:
+        INIT_DATA_LATENCY.observe(time.perf_counter() - start, result)
+
 def get_user_from_init_data(init_data: str) -> Optional[dict]:
     data = verify_init_data(init_data)
     user = data.get("user")
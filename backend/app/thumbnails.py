@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from sqlalchemy import or_, select, update
+
+from .config import settings
+from .db import AsyncSessionLocal
+from .models import LeadAttachment
+
+log = logging.getLogger(__name__)
+
+# Миниатюры фото из заявок. Бот присылает все размеры фото; для миниатюры
+# берётся самый маленький размер со стороной >= THUMB_MIN_SIDE (pick_thumb).
+# Фоновый воркер скачивает его через Bot API (getFile + /file/bot<token>/...)
+# и кладёт в локальный кэш по sha256 содержимого; API отдаёт /api/thumbs/<sha256>.
+# Кэш ограничен по размеру и вытесняет давно не читанные файлы (LRU по mtime).
+# Кэш у каждой реплики свой, поэтому промах в базу не пишет: /api/thumbs/<sha>
+# отвечает 404 и просит воркер своего процесса докачать файл (refetch) —
+# thumb_sha256 в базе остаётся, соседние реплики продолжают отдавать свои копии.
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+MAX_DOWNLOAD = 2 * 1024 * 1024
+# промахи кэша, ждущие докачки; сверх лимита новые отбрасываются (адрес без авторизации)
+MAX_REFETCH = 1000
+
+def pick_thumb(sizes: list[dict], min_side: int) -> Optional[str]:
+    usable = [s for s in sizes if s.get("file_id") and s.get("width") and s.get("height")]
+    if not usable:
+        return None
+    usable.sort(key=lambda s: s["width"] * s["height"])
+    for s in usable:
+        if max(s["width"], s["height"]) >= min_side:
+            return s["file_id"]
+    return usable[-1]["file_id"]
+
+class ThumbnailStore:
+    """Файлы <root>/<sha[:2]>/<sha>.jpg. Запись атомарная (tmp + rename), поэтому
+    кэш можно делить между несколькими процессами API на одной машине."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, sha: str) -> str:
+        return os.path.join(self.root, sha[:2], f"{sha}.jpg")
+
+    def put(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        target = self.path(sha)
+        if os.path.exists(target):
+            os.utime(target)
+            return sha
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+        return sha
+
+    def get(self, sha: str) -> Optional[str]:
+        target = self.path(sha)
+        try:
+            os.utime(target)  # mtime = время последнего чтения, по нему вытесняем
+        except FileNotFoundError:
+            return None
+        return target
+
+    def _files(self) -> list[tuple[float, int, str]]:
+        files = []
+        if not os.path.isdir(self.root):
+            return files
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".jpg"):
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def usage(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self) -> int:
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        # с запасом 10%, чтобы не вытеснять на каждой новой миниатюре
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+class TelegramFileError(RuntimeError):
+    pass
+
+class TelegramFiles:
+    """Скачивание файлов через Bot API. api_url можно направить на локальную заглушку."""
+
+    def __init__(self, token: str, api_url: str = "https://api.telegram.org",
+                 client: Optional[httpx.AsyncClient] = None, max_bytes: int = MAX_DOWNLOAD):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.client = client or httpx.AsyncClient(timeout=20.0)
+        self.max_bytes = max_bytes
+
+    async def download(self, file_id: str) -> bytes:
+        r = await self.client.get(f"{self.api_url}/bot{self.token}/getFile", params={"file_id": file_id})
+        body = r.json()
+        if not body.get("ok"):
+            raise TelegramFileError(body.get("description") or f"getFile failed ({r.status_code})")
+        result = body["result"]
+        if (result.get("file_size") or 0) > self.max_bytes:
+            raise TelegramFileError(f"file too large: {result['file_size']}")
+        r = await self.client.get(f"{self.api_url}/file/bot{self.token}/{result['file_path']}")
+        r.raise_for_status()
+        if len(r.content) > self.max_bytes:
+            raise TelegramFileError(f"file too large: {len(r.content)}")
+        return r.content
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+def _pending():
+    return (
+        LeadAttachment.thumb_sha256.is_(None),
+        LeadAttachment.thumb_file_id.is_not(None),
+    )
+
+class ThumbnailWorker:
+    """Берёт пачку вложений без миниатюры и «арендует» их, сдвигая thumb_next_at
+    на время бэкоффа: если загрузка упадёт или процесс умрёт, строка вернётся
+    в очередь по истечении аренды. В Postgres выборка с SKIP LOCKED, так что
+    несколько процессов API не качают одно и то же."""
+
+    def __init__(
+        self,
+        store: ThumbnailStore,
+        files: TelegramFiles,
+        batch_size: int = 20,
+        concurrency: int = 4,
+        poll_interval: float = 5.0,
+        max_attempts: int = 5,
+        max_backoff: float = 3600.0,
+    ):
+        self.store = store
+        self.files = files
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._task: Optional[asyncio.Task] = None
+        self._refetch: set[str] = set()
+        self.fetched = 0
+        self.failed = 0
+        self.evicted = 0
+        self.refetched = 0
+
+    def _lease(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.max_backoff, 60.0 * 2 ** attempts))
+
+    async def _claim(self) -> list:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                select(LeadAttachment.id, LeadAttachment.thumb_file_id, LeadAttachment.thumb_attempts)
+                .where(
+                    *_pending(),
+                    LeadAttachment.thumb_attempts < self.max_attempts,
+                    or_(LeadAttachment.thumb_next_at.is_(None), LeadAttachment.thumb_next_at <= now),
+                )
+                .order_by(LeadAttachment.id)
+                .limit(self.batch_size)
+            )
+            if session.bind.dialect.name == "postgresql":
+                stmt = stmt.with_for_update(skip_locked=True)
+            rows = (await session.execute(stmt)).all()
+            if rows:
+                await session.execute(update(LeadAttachment), [
+                    {"id": r.id, "thumb_attempts": r.thumb_attempts + 1, "thumb_next_at": now + self._lease(r.thumb_attempts)}
+                    for r in rows
+                ])
+            await session.commit()
+        return rows
+
+    async def _fetch(self, row, sem: asyncio.Semaphore) -> Optional[tuple[int, str]]:
+        async with sem:
+            try:
+                data = await self.files.download(row.thumb_file_id)
+            except Exception as e:
+                self.failed += 1
+                log.warning("thumbnail for attachment %s failed (attempt %s): %s", row.id, row.thumb_attempts + 1, e)
+                return None
+        sha = await asyncio.to_thread(self.store.put, data)
+        self.fetched += 1
+        return row.id, sha
+
+    def refetch(self, sha: str) -> None:
+        """Файла sha нет в локальном кэше: докачать на следующем проходе (в базу не пишет)."""
+        if len(self._refetch) < MAX_REFETCH:
+            self._refetch.add(sha)
+
+    async def _refetch_missing(self) -> int:
+        shas = set()
+        while self._refetch and len(shas) < self.batch_size:
+            shas.add(self._refetch.pop())
+        if not shas:
+            return 0
+        async with AsyncSessionLocal() as session:
+            res = await session.execute(
+                select(LeadAttachment.thumb_sha256, LeadAttachment.thumb_file_id)
+                .where(LeadAttachment.thumb_sha256.in_(shas), LeadAttachment.thumb_file_id.is_not(None))
+            )
+            file_ids = dict(res.all())
+        # sha, которых нет в базе, просто отбрасываются
+        got = 0
+        for sha, file_id in file_ids.items():
+            try:
+                data = await self.files.download(file_id)
+            except Exception as e:
+                self.failed += 1
+                log.warning("thumbnail %s refetch failed: %s", sha, e)
+                continue
+            if await asyncio.to_thread(self.store.put, data) != sha:
+                log.warning("thumbnail %s refetched with different content", sha)
+            got += 1
+        self.refetched += got
+        return got
+
+    async def run_once(self) -> int:
+        refetched = await self._refetch_missing()
+        rows = await self._claim()
+        if not rows:
+            if refetched:
+                self.evicted += await asyncio.to_thread(self.store.evict)
+            return refetched
+        sem = asyncio.Semaphore(self.concurrency)
+        done = [r for r in await asyncio.gather(*(self._fetch(row, sem) for row in rows)) if r]
+        if done:
+            async with AsyncSessionLocal() as session:
+                await session.execute(update(LeadAttachment), [{"id": i, "thumb_sha256": sha} for i, sha in done])
+                await session.commit()
+            self.evicted += await asyncio.to_thread(self.store.evict)
+        return refetched + len(done)
+
+    def metrics(self) -> dict:
+        return {
+            "fetched": self.fetched, "failed": self.failed, "evicted": self.evicted,
+            "refetched": self.refetched, "refetch_pending": len(self._refetch),
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                got = await self.run_once()
+            except Exception:
+                log.exception("thumbnail worker crashed, restarting")
+                got = 0
+            if got < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.files.close()
+
+thumbnail_store = ThumbnailStore(settings.thumb_cache_dir, settings.thumb_cache_max_bytes)
+thumbnail_worker = ThumbnailWorker(thumbnail_store, TelegramFiles(settings.bot_token, settings.telegram_api_url))
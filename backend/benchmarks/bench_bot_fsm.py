@@ -0,0 +1,191 @@
+"""Прогон диалогов бота (LeadFSM и ContractorFSM) для множества пользователей одновременно.
+
+Бот работает в этом процессе и ходит в заглушку Bot API (fake_telegram). Заявки
+через outbox уходят в API, который поднимается отдельным процессом, как в load_api.
+Нужны зависимости и бэкенда, и бота (bot/requirements.txt).
+
+    cd backend && python -m benchmarks.bench_bot_fsm --users 300 --concurrency 100
+    cd backend && python -m benchmarks.bench_bot_fsm --fsm sqlite   (SqlStorage вместо памяти)
+    cd backend && python -m benchmarks.bench_bot_fsm --webhook      (через очереди UpdateWorkerPool)
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from benchmarks.common import (
+    REPO_ROOT, Recorder, free_port, load_baseline, print_summary, run_api, save_baseline,
+)
+from benchmarks.fake_telegram import FakeTelegram
+
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "123:bench")
+ADMIN_ID = 42
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+def _user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"User{uid}", "username": f"user{uid}"}
+
+def message(uid: int, text: Optional[str] = None, photo: Optional[list] = None) -> dict:
+    msg = {"message_id": next(_message_ids), "date": int(time.time()), "chat": {"id": uid, "type": "private"}, "from": _user(uid)}
+    if text is not None:
+        msg["text"] = text
+    if text and text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if photo is not None:
+        msg["photo"] = photo
+    return {"update_id": next(_update_ids), "message": msg}
+
+def callback(uid: int, data: str) -> dict:
+    menu = {"message_id": next(_message_ids), "date": int(time.time()), "chat": {"id": uid, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "BenchBot"}, "text": "menu"}
+    return {"update_id": next(_update_ids), "callback_query": {
+        "id": str(next(_update_ids)), "from": _user(uid), "chat_instance": str(uid), "data": data, "message": menu,
+    }}
+
+def photo_sizes(uid: int, n: int) -> list[dict]:
+    return [
+        {"file_id": f"ph{uid}_{n}_{w}", "file_unique_id": f"u{uid}_{n}_{w}", "width": w, "height": w * 3 // 4, "file_size": w * 40}
+        for w in (90, 320, 800, 1280)
+    ]
+
+def lead_flow(uid: int) -> list[tuple[str, dict]]:
+    return [
+        ("start", message(uid, "/start")),
+        ("cb lead", callback(uid, "lead")),
+        ("name", message(uid, "Иван")),
+        ("phone", message(uid, "+7 900 000-00-00")),
+        ("city", message(uid, "Москва")),
+        ("work_type", message(uid, "ремонт под ключ")),
+        ("budget", message(uid, "500 тыс.")),
+        ("description", message(uid, "Двушка, вторичка, нужен ремонт под ключ")),
+        ("photo", message(uid, photo=photo_sizes(uid, 1))),
+        ("photo", message(uid, photo=photo_sizes(uid, 2))),
+        ("done", message(uid, "ГОТОВО")),
+    ]
+
+def contractor_flow(uid: int) -> list[tuple[str, dict]]:
+    return [
+        ("start", message(uid, "/start")),
+        ("cb contractor", callback(uid, "contractor")),
+        ("name", message(uid, "Бригада Петрова")),
+        ("phone", message(uid, "+7 901 111-11-11")),
+        ("city", message(uid, "Казань")),
+        ("specialization", message(uid, "электрика")),
+        ("experience", message(uid, "10 лет")),
+        ("description", message(uid, "5 человек, свой инструмент")),
+    ]
+
+def flows(users: int) -> list[tuple[str, list]]:
+    result = []
+    for i in range(users):
+        uid = 10_000 + i
+        result.append(("lead", lead_flow(uid)) if i % 3 else ("contractor", contractor_flow(uid)))
+    return result
+
+async def _drain_outbox(outbox, rec: Recorder, expected: int, timeout: float = 120.0) -> None:
+    start = time.perf_counter()
+    while await outbox.depth() > 0 and time.perf_counter() - start < timeout:
+        await asyncio.sleep(0.05)
+    rec.add(f"outbox drain ({expected} leads)", time.perf_counter() - start, ok=await outbox.depth() == 0)
+
+async def replay(users: int, concurrency: int, webhook: bool) -> tuple[Recorder, FakeTelegram]:
+    from aiogram.types import Update
+    from bot.app.bot import create_bot, create_dispatcher
+    from bot.app.outbox import outbox
+    from bot.app.webhook import UpdateWorkerPool
+
+    fake = FakeTelegram()
+    await fake.start(int(os.environ["FAKE_TELEGRAM_PORT"]))
+    bot = create_bot()
+    dp = create_dispatcher()
+    rec = Recorder()
+    scripts = flows(users)
+    try:
+        if webhook:
+            pool = UpdateWorkerPool(dp, bot, workers=concurrency, queue_size=users * 12)
+            await pool.start()
+            rec = Recorder()
+            start = time.perf_counter()
+            for _, script in scripts:
+                for _, update in script:
+                    pool.submit(update)
+            await asyncio.gather(*(q.join() for q in pool._queues))
+            total = sum(len(s) for _, s in scripts)
+            rec.add(f"webhook: {total} updates", time.perf_counter() - start, ok=pool.failed == 0)
+            await _drain_outbox(outbox, rec, users)
+            await pool.stop()
+        else:
+            await dp.emit_startup(bot=bot, dispatcher=dp, bots=[bot])
+            rec = Recorder()
+            sem = asyncio.Semaphore(concurrency)
+
+            async def run_user(kind: str, script: list) -> None:
+                async with sem:
+                    with rec.measure(f"{kind} flow"):
+                        for step, data in script:
+                            with rec.measure(f"{kind}: {step}"):
+                                await dp.feed_update(bot, Update.model_validate(data, context={"bot": bot}))
+
+            results = await asyncio.gather(*(run_user(kind, script) for kind, script in scripts), return_exceptions=True)
+            failed = [r for r in results if isinstance(r, Exception)]
+            if failed:
+                print(f"{len(failed)} flows failed, first: {failed[0]!r}")
+            await _drain_outbox(outbox, rec, users)
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, bots=[bot])
+            await bot.session.close()
+        rec.stop()
+    finally:
+        await fake.stop()
+    return rec, fake
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_bot_fsm")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--fsm", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--webhook", action="store_true", help="feed updates through UpdateWorkerPool")
+    parser.add_argument("--api-url", help="already running API (otherwise one is started on SQLite)")
+    parser.add_argument("--db", help="SQLAlchemy URL for the started API")
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tg_port = free_port()
+        os.environ.update({
+            "BOT_TOKEN": BOT_TOKEN,
+            "ADMIN_TELEGRAM_IDS": str(ADMIN_ID),
+            "TELEGRAM_API_URL": f"http://127.0.0.1:{tg_port}",
+            "FAKE_TELEGRAM_PORT": str(tg_port),
+            "OUTBOX_PATH": os.path.join(tmp, "outbox.sqlite3"),
+            "OUTBOX_POLL_INTERVAL": "0.05",
+            "FSM_STORAGE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'fsm.sqlite3')}" if args.fsm == "sqlite" else "",
+        })
+        sys.path.insert(0, REPO_ROOT)  # бот импортируется как пакет bot.app
+
+        def go(api_url: str) -> tuple[Recorder, FakeTelegram]:
+            os.environ["API_INTERNAL_URL"] = api_url
+            return asyncio.run(replay(args.users, args.concurrency, args.webhook))
+
+        if args.api_url:
+            rec, fake = go(args.api_url)
+        else:
+            db = args.db or f"sqlite+aiosqlite:///{os.path.join(tmp, 'api.sqlite3')}"
+            with run_api(db, {"BOT_TOKEN": BOT_TOKEN, "ADMIN_TELEGRAM_IDS": str(ADMIN_ID)}) as api_url:
+                rec, fake = go(api_url)
+
+    summary = rec.summary()
+    print_summary(summary, load_baseline(args.compare) if args.compare else None)
+    print("Bot API calls:", dict(fake.calls))
+    if args.save:
+        meta = {"users": args.users, "concurrency": args.concurrency, "fsm": args.fsm, "webhook": args.webhook}
+        print("saved", save_baseline(args.save, summary, meta))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Verified initData per second: old per-request path vs precomputed key + cache.
+
+    cd backend && BOT_TOKEN=123:bench python -m benchmarks.bench_init_data
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+from app import telegram_auth
+from benchmarks import common
+from app.config import settings
+
+def make_init_data(user_id: int = 42) -> str:
+    return common.make_init_data(settings.bot_token, user_id)
+
+def legacy_verify(init_data: str) -> dict:
+    # то, что делал verify_init_data до кэша: ключ и HMAC на каждый запрос
+    data = telegram_auth._parse_init_data(init_data)
+    received_hash = data.pop("hash")
+    data_check_string = "\n".join(f"{k}={data[k]}" for k in sorted(data.keys()))
+    secret_key = hashlib.sha256(settings.bot_token.encode("utf-8")).digest()
+    calculated = hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+    assert hmac.compare_digest(calculated, received_hash)
+    data["user"] = json.loads(data["user"])
+    return data
+
+def rate(fn, arg: str, seconds: float = 1.0) -> float:
+    n = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(200):
+            fn(arg)
+        n += 200
+    return n / (time.perf_counter() - start)
+
+def main() -> None:
+    init_data = make_init_data()
+    telegram_auth._cache.clear()
+    before = rate(legacy_verify, init_data)
+    uncached = rate(telegram_auth._verify_uncached, init_data)
+    cached = rate(telegram_auth.verify_init_data, init_data)
+    print(f"legacy verify_init_data   {before:12,.0f} req/s")
+    print(f"precomputed key, no cache {uncached:12,.0f} req/s")
+    print(f"cached verify_init_data   {cached:12,.0f} req/s  (x{cached / before:.1f})")
+
+if __name__ == "__main__":
+    main()
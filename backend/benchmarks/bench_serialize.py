@@ -0,0 +1,121 @@
+"""Serialization of an admin page of leads: response_model path vs ORJSONResponse.
+
+Old path = what FastAPI does with a returned dict: validate against LeadPage,
+dump it back to JSON-able Python and encode with the stdlib json. New path =
+the same dicts straight into orjson. Also checks that the fast path produces
+exactly what LeadPage describes, so OpenAPI stays truthful.
+
+    cd backend && python -m benchmarks.bench_serialize --leads 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+import orjson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models import Lead
+from app.schemas import LeadPage
+from app.serializers import lead_to_dict
+from benchmarks.load_api import CITIES, WORKS
+
+def make_leads(n: int, seed: int = 1) -> list[Lead]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    leads = []
+    for i in range(n):
+        lead = Lead(
+            id=i + 1,
+            lead_type=rng.choice(["client_request", "contractor_application"]),
+            name=f"Клиент {i}",
+            phone=f"+7 9{rng.randint(10**8, 10**9 - 1)}",
+            city=rng.choice(CITIES),
+            work_type=rng.choice(WORKS),
+            budget=f"{rng.randint(50, 3000)} тыс.",
+            description="Нужен ремонт ванной комнаты, демонтаж старой плитки. " * rng.randint(1, 4),
+            status=rng.choice(["new", "in_progress", "done"]),
+            version=1,
+            created_at=start + timedelta(seconds=rng.randint(0, 10**7), microseconds=rng.randint(0, 999999)),
+        )
+        lead.attachment_count = rng.randint(0, 3)
+        leads.append(lead)
+    return leads
+
+def legacy_lead_to_dict(lead: Lead) -> dict:
+    # serializers.lead_to_dict до перехода на orjson: атрибуты через ORM, дата строкой
+    return {
+        "id": lead.id,
+        "lead_type": lead.lead_type,
+        "name": lead.name,
+        "phone": lead.phone,
+        "city": lead.city,
+        "work_type": lead.work_type,
+        "budget": lead.budget,
+        "description": lead.description,
+        "status": lead.status,
+        "version": lead.version,
+        "created_at": lead.created_at.isoformat(),
+        "attachment_count": lead.attachment_count,
+    }
+
+FIELD = create_model_field(name="Response_admin_list_leads", type_=LeadPage, mode="serialization")
+
+async def response_model_path(leads: list[Lead]) -> bytes:
+    content = {"items": [legacy_lead_to_dict(l) for l in leads], "next_cursor": None}
+    return JSONResponse(await serialize_response(field=FIELD, response_content=content)).body
+
+def fast_path(leads: list[Lead]) -> bytes:
+    return ORJSONResponse({"items": [lead_to_dict(l) for l in leads], "next_cursor": None}).body
+
+def ndjson_stdlib(leads: list[Lead]) -> bytes:
+    # export.ndjson_chunks до перехода на orjson
+    return ("\n".join(json.dumps(legacy_lead_to_dict(l), ensure_ascii=False) for l in leads) + "\n").encode("utf-8")
+
+def ndjson_orjson(leads: list[Lead]) -> bytes:
+    return b"\n".join(orjson.dumps(lead_to_dict(l)) for l in leads) + b"\n"
+
+def timed(fn, leads: list[Lead], repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(leads)
+        if asyncio.iscoroutine(body):
+            body = asyncio.run(body)
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_serialize")
+    parser.add_argument("--leads", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    leads = make_leads(args.leads)
+    old_t, old_body = timed(response_model_path, leads, args.repeat)
+    new_t, new_body = timed(fast_path, leads, args.repeat)
+    # тот же документ и он проходит валидацию схемой из OpenAPI
+    assert json.loads(old_body) == json.loads(new_body)
+    LeadPage.model_validate_json(new_body)
+
+    nd_old_t, nd_old = timed(ndjson_stdlib, leads, args.repeat)
+    nd_new_t, nd_new = timed(ndjson_orjson, leads, args.repeat)
+    assert [json.loads(x) for x in nd_old.splitlines()] == [json.loads(x) for x in nd_new.splitlines()]
+
+    n = args.leads
+    print(f"{n} leads, best of {args.repeat}")
+    print(f"response_model + json     {old_t * 1000:8.1f} ms  {n / old_t:10,.0f} leads/s  {len(old_body):,} bytes")
+    print(f"ORJSONResponse            {new_t * 1000:8.1f} ms  {n / new_t:10,.0f} leads/s  (x{old_t / new_t:.1f})")
+    print(f"ndjson export, json       {nd_old_t * 1000:8.1f} ms  {n / nd_old_t:10,.0f} leads/s")
+    print(f"ndjson export, orjson     {nd_new_t * 1000:8.1f} ms  {n / nd_new_t:10,.0f} leads/s  (x{nd_old_t / nd_new_t:.1f})")
+
+if __name__ == "__main__":
+    main()
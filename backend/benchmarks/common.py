@@ -0,0 +1,149 @@
+"""Общие части бенчмарков: подписанный initData, запуск API, замеры и базовые линии."""
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+from collections import defaultdict
+from typing import Iterator, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+def make_init_data(bot_token: str, user_id: int = 42, username: str = "bench") -> str:
+    """initData, подписанный так же, как его проверяет telegram_auth.verify_init_data."""
+    data = {
+        "auth_date": str(int(time.time())),
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({"id": user_id, "first_name": "Bench", "username": username}),
+    }
+    dcs = "\n".join(f"{k}={data[k]}" for k in sorted(data))
+    secret = hashlib.sha256(bot_token.encode("utf-8")).digest()
+    data["hash"] = hmac.new(secret, dcs.encode("utf-8"), hashlib.sha256).hexdigest()
+    return urllib.parse.urlencode(data)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@contextlib.contextmanager
+def run_api(db_url: str, env: dict, workers: int = 1, port: Optional[int] = None) -> Iterator[str]:
+    """Поднять API отдельным процессом: python -m app.migrate, затем uvicorn."""
+    port = port or free_port()
+    proc_env = {**os.environ, **env, "DB_URL": db_url, "THUMB_WORKER": "0", "ARCHIVE_WORKER": "0"}
+    migrated = subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, env=proc_env,
+                              capture_output=True, text=True)
+    if migrated.returncode != 0:
+        raise RuntimeError(f"python -m app.migrate failed:\n{migrated.stderr}")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=proc_env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 30
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"API exited with code {proc.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                    break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError("API did not start in 30s")
+                time.sleep(0.1)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+class Recorder:
+    """Латентности по именам операций (секунды) и ошибки."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def add(self, name: str, seconds: float, ok: bool = True) -> None:
+        self.latencies[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+
+    @contextlib.contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.add(name, time.perf_counter() - start, ok)
+
+    def stop(self) -> None:
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict[str, dict]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        result = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            result[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+        return result
+
+def _delta(now: float, before: float) -> str:
+    if not before:
+        return ""
+    return f"{(now - before) / before * 100:+.0f}%"
+
+def print_summary(summary: dict[str, dict], baseline: Optional[dict] = None) -> None:
+    header = f"{'operation':28} {'count':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'Δrps':>7} {'Δp95':>7}"
+    print(header)
+    for name, s in summary.items():
+        line = (f"{name:28} {s['count']:7d} {s['errors']:5d} {s['rps']:9.1f} "
+                f"{s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['p99_ms']:9.2f}")
+        if baseline and name in baseline:
+            b = baseline[name]
+            line += f" {_delta(s['rps'], b['rps']):>7} {_delta(s['p95_ms'], b['p95_ms']):>7}"
+        print(line)
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+def save_baseline(name: str, summary: dict, meta: dict) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": summary}, f, ensure_ascii=False, indent=1)
+    return path
+
+def load_baseline(name: str) -> dict:
+    with open(baseline_path(name), "r", encoding="utf-8") as f:
+        return json.load(f)["results"]
@@ -0,0 +1,103 @@
+"""Заглушка Telegram Bot API для бенчмарков и локальных прогонов.
+
+Отвечает на методы, которые вызывают бот и API (sendMessage, answerCallbackQuery,
+getMe, setWebhook, getFile и скачивание файла), ничего не отправляя наружу.
+Бот направляется сюда через TELEGRAM_API_URL, API — так же (миниатюры).
+
+    cd backend && python -m benchmarks.fake_telegram --port 8081
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter
+from typing import Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "BenchBot", "username": "bench_bot"}
+
+class FakeTelegram:
+    def __init__(self, latency: float = 0.0, file_size: int = 12_000):
+        self.latency = latency  # искусственная задержка ответа Bot API, сек
+        self.file_size = file_size
+        self.calls: Counter = Counter()
+        self.sent: Counter = Counter()  # chat_id -> сообщений
+        self._message_ids = itertools.count(1)
+        self._server: Optional[uvicorn.Server] = None
+        self._task: Optional[asyncio.Task] = None
+        self.app = Starlette(routes=[
+            Route("/bot{token}/{method}", self._method, methods=["GET", "POST"]),
+            Route("/file/bot{token}/{path:path}", self._file),
+        ])
+
+    async def _params(self, request: Request) -> dict:
+        params = dict(request.query_params)
+        if request.method == "POST":
+            ctype = request.headers.get("content-type", "")
+            if ctype.startswith("application/json"):
+                params.update(await request.json())
+            else:
+                params.update({k: v for k, v in (await request.form()).items() if isinstance(v, str)})
+        return params
+
+    def _message(self, chat_id: int, text: Optional[str]) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text or "",
+        }
+
+    async def _method(self, request: Request) -> Response:
+        method = request.path_params["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "getMe":
+            result = BOT_USER
+        elif method in ("sendMessage", "sendDocument", "sendPhoto"):
+            chat_id = int(params.get("chat_id", 0))
+            self.sent[chat_id] += 1
+            result = self._message(chat_id, params.get("text"))
+        elif method == "getFile":
+            file_id = params.get("file_id", "")
+            result = {"file_id": file_id, "file_unique_id": file_id[:16],
+                      "file_size": self.file_size, "file_path": f"photos/{file_id}.jpg"}
+        else:
+            # answerCallbackQuery, setWebhook, deleteWebhook, ... — просто ok
+            result = True
+        return JSONResponse({"ok": True, "result": result})
+
+    async def _file(self, request: Request) -> Response:
+        self.calls["file"] += 1
+        seed = request.path_params["path"].encode("utf-8")
+        body = (seed * (self.file_size // max(1, len(seed)) + 1))[: self.file_size]
+        return Response(b"\xff\xd8\xff\xe0" + body, media_type="image/jpeg")
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> None:
+        """Запустить в текущем цикле событий (для бенчмарков в одном процессе с ботом)."""
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning", access_log=False))
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+            await asyncio.sleep(0.01)
+
+    async def stop(self) -> None:
+        self._server.should_exit = True
+        await self._task
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_telegram")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(FakeTelegram(args.latency).app, host=args.host, port=args.port, log_level="info")
@@ -0,0 +1,171 @@
+"""Нагрузочный прогон API: смесь чтения контента, создания заявок, админки и экспорта.
+
+    cd backend && python -m benchmarks.load_api --duration 20 --concurrency 50
+    cd backend && python -m benchmarks.load_api --db postgresql+asyncpg://u:p@localhost/bench --workers 4
+    cd backend && python -m benchmarks.load_api --url http://localhost:8000   (уже запущенный API)
+
+--save NAME пишет результаты в benchmarks/baselines/NAME.json, --compare NAME
+печатает изменения rps и p95 относительно сохранённого прогона.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import Recorder, load_baseline, make_init_data, print_summary, run_api, save_baseline
+
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "123:bench")
+ADMIN_ID = 42
+USERS = 500  # разных пользователей WebApp: кэш initData прогревается, но не на одном ключе
+
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Екатеринбург", "Новосибирск"]
+WORKS = ["ремонт под ключ", "электрика", "плитка", "сантехника", "отделка"]
+
+def lead_payload(rng: random.Random) -> dict:
+    return {
+        "lead_type": rng.choice(["client_request", "client_request", "contractor_application"]),
+        "name": f"Бенч {rng.randint(1, 10**6)}",
+        "phone": f"+7 9{rng.randint(10**8, 10**9 - 1)}",
+        "city": rng.choice(CITIES),
+        "work_type": rng.choice(WORKS),
+        "budget": f"{rng.randint(50, 3000)} тыс.",
+        "description": "Нужен ремонт ванной комнаты, демонтаж старой плитки, " * rng.randint(1, 4),
+        "idempotency_key": uuid.uuid4().hex,
+    }
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, rec: Recorder, rng: random.Random):
+        self.client = client
+        self.rec = rec
+        self.rng = rng
+        self.user_headers = [{"X-Telegram-Init-Data": make_init_data(BOT_TOKEN, 1000 + i, f"u{i}")} for i in range(USERS)]
+        self.admin = {"X-Telegram-Init-Data": make_init_data(BOT_TOKEN, ADMIN_ID, "admin")}
+        self.etags: dict[str, str] = {}
+
+    async def _call(self, name: str, method: str, url: str, ok=(200,), **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            r = await self.client.request(method, url, **kwargs)
+            await r.aread()
+        except httpx.HTTPError:
+            self.rec.add(name, time.perf_counter() - start, ok=False)
+            raise
+        self.rec.add(name, time.perf_counter() - start, ok=r.status_code in ok)
+        return r
+
+    async def content(self) -> None:
+        name = self.rng.choice(["faq", "documents", "projects"])
+        await self._call(f"GET content/{name}", "GET", f"/api/content/{name}")
+
+    async def content_revalidate(self) -> None:
+        # клиент с кэшем: If-None-Match -> 304
+        name = self.rng.choice(["faq", "documents", "projects"])
+        headers = {"If-None-Match": self.etags[name]} if name in self.etags else {}
+        r = await self._call("GET content (etag)", "GET", f"/api/content/{name}", ok=(200, 304), headers=headers)
+        if "etag" in r.headers:
+            self.etags[name] = r.headers["etag"]
+
+    async def create_lead(self) -> None:
+        headers = self.rng.choice(self.user_headers)
+        await self._call("POST leads", "POST", "/api/leads", json=lead_payload(self.rng), headers=headers)
+
+    async def admin_list(self) -> None:
+        params = {"limit": 100}
+        if self.rng.random() < 0.3:
+            params["status"] = "new"
+        await self._call("GET admin/leads", "GET", "/api/admin/leads", params=params, headers=self.admin)
+
+    async def admin_page2(self) -> None:
+        r = await self._call("GET admin/leads (page 1)", "GET", "/api/admin/leads", params={"limit": 50}, headers=self.admin)
+        cursor = r.json().get("next_cursor") if r.status_code == 200 else None
+        if cursor:
+            await self._call("GET admin/leads (page 2)", "GET", "/api/admin/leads",
+                             params={"limit": 50, "cursor": cursor}, headers=self.admin)
+
+    async def admin_search(self) -> None:
+        q = self.rng.choice(["ремонт", "плитка", "Бенч", "+7 9"])
+        await self._call("GET admin/leads/search", "GET", "/api/admin/leads/search", params={"q": q}, headers=self.admin)
+
+    async def admin_stats(self) -> None:
+        await self._call("GET admin/stats", "GET", "/api/admin/stats", params={"group_by": "day,status"}, headers=self.admin)
+
+    async def export_csv(self) -> None:
+        await self._call("GET export/leads.csv", "GET", "/api/admin/export/leads.csv", headers=self.admin)
+
+    def mix(self) -> list[tuple]:
+        return [
+            (self.content, 30),
+            (self.content_revalidate, 15),
+            (self.create_lead, 20),
+            (self.admin_list, 15),
+            (self.admin_page2, 5),
+            (self.admin_search, 7),
+            (self.admin_stats, 6),
+            (self.export_csv, 2),
+        ]
+
+async def prefill(client: httpx.AsyncClient, count: int, rng: random.Random) -> None:
+    headers = {"X-Bot-Token": BOT_TOKEN}
+    for start in range(0, count, 500):
+        batch = [lead_payload(rng) for _ in range(min(500, count - start))]
+        r = await client.post("/api/bot/leads:batch", json={"leads": batch}, headers=headers)
+        r.raise_for_status()
+
+async def run(url: str, duration: float, concurrency: int, leads: int, seed: int) -> Recorder:
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        if leads:
+            await prefill(client, leads, rng)
+        rec = Recorder()
+        scenario = Scenario(client, rec, rng)
+        actions, weights = zip(*scenario.mix())
+        deadline = time.perf_counter() + duration
+
+        async def user() -> None:
+            while time.perf_counter() < deadline:
+                action = rng.choices(actions, weights)[0]
+                try:
+                    await action()
+                except httpx.HTTPError:
+                    pass
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        rec.stop()
+    return rec
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_api")
+    parser.add_argument("--url", help="already running API (otherwise one is started)")
+    parser.add_argument("--db", help="SQLAlchemy URL for the started API (default: temporary SQLite)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started API")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--leads", type=int, default=2000, help="leads to create before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="save results as a baseline (name or path)")
+    parser.add_argument("--compare", help="compare with a saved baseline (name or path)")
+    args = parser.parse_args()
+
+    meta = {k: getattr(args, k) for k in ("url", "db", "workers", "duration", "concurrency", "leads", "seed")}
+    if args.url:
+        rec = asyncio.run(run(args.url, args.duration, args.concurrency, args.leads, args.seed))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = args.db or f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+            env = {"BOT_TOKEN": BOT_TOKEN, "ADMIN_TELEGRAM_IDS": str(ADMIN_ID)}
+            with run_api(db, env, workers=args.workers) as url:
+                rec = asyncio.run(run(url, args.duration, args.concurrency, args.leads, args.seed))
+
+    summary = rec.summary()
+    print_summary(summary, load_baseline(args.compare) if args.compare else None)
+    if args.save:
+        print("saved", save_baseline(args.save, summary, meta))
+
+if __name__ == "__main__":
+    main()
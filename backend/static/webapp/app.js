@@ -162,12 +162,112 @@ function renderAdminIntro() {
   ]);
 }
 
+let adminStatus = "";
+let adminSearch = "";
+let adminStream = null;
+
+function stopLeadStream() {
+  if (adminStream) adminStream.abort();
+  adminStream = null;
+}
+
+// SSE через fetch: EventSource не умеет слать X-Telegram-Init-Data
+function startLeadStream(onEvent) {
+  stopLeadStream();
+  const ctrl = new AbortController();
+  adminStream = ctrl;
+  let lastId = "";
+  (async ()=>{
+    while (!ctrl.signal.aborted) {
+      try{
+        const headers = {"X-Telegram-Init-Data": initData};
+        if (lastId) headers["Last-Event-ID"] = lastId;
+        const res = await fetch("/api/admin/leads/stream", {headers, signal: ctrl.signal});
+        if (!res.ok) return;
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buf = "";
+        for (;;) {
+          const {value, done} = await reader.read();
+          if (done) break;
+          buf += value;
+          let sep;
+          while ((sep = buf.indexOf("\n\n")) >= 0) {
+            const block = buf.slice(0, sep);
+            buf = buf.slice(sep + 2);
+            const msg = {event: "message", data: ""};
+            block.split("\n").forEach(line=>{
+              const i = line.indexOf(":");
+              if (i <= 0) return;
+              const k = line.slice(0, i), v = line.slice(i + 1).trimStart();
+              if (k === "id") lastId = v;
+              else if (k === "event") msg.event = v;
+              else if (k === "data") msg.data += v;
+            });
+            if (msg.data) onEvent(msg.event, JSON.parse(msg.data));
+          }
+        }
+      }catch(err){
+        if (ctrl.signal.aborted) return;
+      }
+      await new Promise(r=>setTimeout(r, 3000));
+    }
+  })();
+}
+
+function leadsQuery(cursor) {
+  const q = new URLSearchParams({limit: "100"});
+  if (adminStatus) q.set("status", adminStatus);
+  if (adminSearch) q.set("q", adminSearch);
+  if (cursor) q.set("cursor", cursor);
+  return (adminSearch ? "/api/admin/leads/search?" : "/api/admin/leads?") + q.toString();
+}
+
+function renderLeadRow(l) {
+  const actions = h("div",{class:"wa-row"},[
+    h("button",{class:"wa-btn",onclick: async ()=>{
+      const s = prompt("Новый статус (new → in_progress → done / rejected):", l.status);
+      if (!s) return;
+      try{
+        await apiAuth(`/api/admin/leads/${l.id}`, {method:"PATCH", body: JSON.stringify({status:s, version:l.version})});
+        loadTab("admin");
+      }catch(err){
+        // 409: заявку уже поменял другой админ или переход недопустим
+        alert("Ошибка: " + err.message);
+        loadTab("admin");
+      }
+    }},"Статус"),
+  ]);
+  if (l.attachment_count > 0) {
+    const photos = h("div",{class:"wa-row"});
+    const btn = h("button",{class:"wa-btn",onclick: async ()=>{
+      try{
+        const items = await apiAuth(`/api/admin/leads/${l.id}/attachments`, {method:"GET"});
+        photos.innerHTML = "";
+        items.forEach(a=>photos.appendChild(a.thumb_url
+          ? h("img",{src:a.thumb_url,loading:"lazy",style:"max-width:96px;max-height:96px;border-radius:6px"})
+          : h("span",{class:"wa-muted"},"фото ещё загружается")));
+        btn.remove();
+      }catch(err){ alert("Ошибка: " + err.message); }
+    }}, `Фото (${l.attachment_count})`);
+    actions.appendChild(btn);
+    actions.appendChild(photos);
+  }
+  return h("tr",{"data-id": String(l.id)},[
+    h("td",{}, String(l.id)),
+    h("td",{}, l.lead_type),
+    h("td",{}, (l.name||"") + "\n" + (l.phone||"")),
+    h("td",{}, (l.city||"") + "\n" + (l.work_type||"") + "\n" + (l.budget||"")),
+    h("td",{}, h("span",{class:"wa-status"}, statusBadge(l.status))),
+    h("td",{}, actions)
+  ]);
+}
+
 async function renderAdmin() {
   const wrap = h("div",{class:"wa-grid"},[renderAdminIntro()]);
   if (!tg) return wrap;
 
   try{
-    const leads = await apiAuth("/api/admin/leads?limit=200", {method:"GET"});
+    const page = await apiAuth(leadsQuery(null), {method:"GET"});
     const table = h("table",{class:"wa-table"});
     table.appendChild(h("thead",{},[
       h("tr",{},[
@@ -180,32 +280,43 @@ async function renderAdmin() {
       ])
     ]));
     const tbody = h("tbody");
-    leads.forEach(l=>{
-      const actions = h("div",{class:"wa-row"},[
-        h("button",{class:"wa-btn",onclick: async ()=>{
-          const s = prompt("Новый статус (new / in_progress / done / rejected):", l.status);
-          if (!s) return;
-          try{
-            await apiAuth(`/api/admin/leads/${l.id}`, {method:"PATCH", body: JSON.stringify({status:s})});
-            loadTab("admin");
-          }catch(err){ alert("Ошибка: " + err.message); }
-        }},"Статус"),
-      ]);
-      tbody.appendChild(h("tr",{},[
-        h("td",{}, String(l.id)),
-        h("td",{}, l.lead_type),
-        h("td",{}, (l.name||"") + "\n" + (l.phone||"")),
-        h("td",{}, (l.city||"") + "\n" + (l.work_type||"") + "\n" + (l.budget||"")),
-        h("td",{}, h("span",{class:"wa-status"}, statusBadge(l.status))),
-        h("td",{}, actions)
-      ]));
-    });
+    page.items.forEach(l=>tbody.appendChild(renderLeadRow(l)));
     table.appendChild(tbody);
 
+    let loaded = page.items.length;
+    let cursor = page.next_cursor;
+    const title = h("div",{style:"font-weight:900;margin-bottom:8px"}, `Заявки (${loaded})`);
+    const moreBtn = h("button",{class:"wa-btn",style:"margin-top:10px",onclick: async ()=>{
+      try{
+        const next = await apiAuth(leadsQuery(cursor), {method:"GET"});
+        next.items.forEach(l=>tbody.appendChild(renderLeadRow(l)));
+        loaded += next.items.length;
+        cursor = next.next_cursor;
+        title.textContent = `Заявки (${loaded})`;
+        if (!cursor) moreBtn.remove();
+      }catch(err){ alert("Ошибка: " + err.message); }
+    }}, "Загрузить ещё");
+
+    const statusSelect = h("select",{class:"wa-input",style:"max-width:200px",onchange:(e)=>{
+      adminStatus = e.target.value;
+      loadTab("admin");
+    }}, ["", "new", "in_progress", "done", "rejected"].map(s=>{
+      const opt = h("option",{value:s}, s ? statusBadge(s) : "Все статусы");
+      if (s === adminStatus) opt.selected = true;
+      return opt;
+    }));
+
+    const searchInput = h("input",{class:"wa-input",style:"max-width:260px",placeholder:"Поиск: имя, телефон, @username",value:adminSearch,onkeydown:(e)=>{
+      if (e.key !== "Enter") return;
+      const v = e.target.value.trim();
+      adminSearch = v.length >= 2 ? v : "";
+      loadTab("admin");
+    }});
+
     const exportBtn = h("a",{class:"wa-btn primary",href:"#",onclick:(e)=>{
       e.preventDefault();
       // open export in same webview
-      const url = "/api/admin/export/leads.csv";
+      const url = "/api/admin/export/leads.csv" + (adminStatus ? "?status=" + encodeURIComponent(adminStatus) : "");
       // we must include initData - easiest is to fetch and download as blob
       (async ()=>{
         try{
@@ -223,10 +334,25 @@ async function renderAdmin() {
       })();
     }}, "Экспорт CSV");
 
+    const matches = (l)=> !adminStatus || l.status === adminStatus;
+    startLeadStream((event, data)=>{
+      if (event === "reset") { loadTab("admin"); return; }
+      const row = tbody.querySelector(`tr[data-id="${data.id}"]`);
+      if (event === "lead.updated" && row) {
+        if (matches(data)) row.replaceWith(renderLeadRow(data));
+        else { row.remove(); loaded -= 1; }
+      } else if (event === "lead.created" && !row && !adminSearch && matches(data)) {
+        tbody.prepend(renderLeadRow(data));
+        loaded += 1;
+      }
+      title.textContent = `Заявки (${loaded})`;
+    });
+
     wrap.appendChild(h("div",{class:"wa-card"},[
-      h("div",{style:"font-weight:900;margin-bottom:8px"}, `Заявки (${leads.length})`),
-      exportBtn,
-      h("div",{style:"margin-top:10px;overflow:auto"}, table)
+      title,
+      h("div",{class:"wa-row"},[searchInput, statusSelect, exportBtn]),
+      h("div",{style:"margin-top:10px;overflow:auto"}, table),
+      cursor ? moreBtn : null
     ]));
 
   }catch(err){
@@ -240,6 +366,7 @@ async function renderAdmin() {
 }
 
 async function loadTab(tab) {
+  stopLeadStream();
   [...tabs.querySelectorAll(".wa-tab")].forEach(t=>t.classList.toggle("active", t.dataset.tab === tab));
   view.innerHTML = "";
   const loader = h("div",{class:"wa-card"},[
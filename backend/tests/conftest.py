@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# настройки читаются при импорте app.config — до него
+_tmp = tempfile.mkdtemp(prefix="api-tests-")
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("DB_URL", f"sqlite+aiosqlite:///{os.path.join(_tmp, 'api.sqlite3')}")
+os.environ.setdefault("AUTO_MIGRATE", "1")
+os.environ.setdefault("THUMB_WORKER", "0")
+os.environ.setdefault("ARCHIVE_WORKER", "0")
+os.environ.setdefault("THUMB_CACHE_DIR", os.path.join(_tmp, "thumbs"))
@@ -0,0 +1,13 @@
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+def test_metrics_core_copies_match():
+    # API и бот собираются из своих папок, поэтому metrics_core.py лежит в обоих пакетах
+    backend = ROOT / "backend" / "app" / "metrics_core.py"
+    bot = ROOT / "bot" / "app" / "metrics_core.py"
+    if not bot.exists():
+        pytest.skip("bot/ is not next to backend/ (e.g. inside the API image)")
+    assert backend.read_bytes() == bot.read_bytes(), "backend/app/metrics_core.py and bot/app/metrics_core.py differ"
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.main import app
+from app.thumbnails import TelegramFiles, thumbnail_store, thumbnail_worker
+
+class _FakeTelegram(BaseHTTPRequestHandler):
+    """Заглушка Bot API: getFile и /file/bot<token>/<path> с содержимым по file_id."""
+    calls: list = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.calls.append(url.path)
+        if url.path.endswith("/getFile"):
+            file_id = parse_qs(url.query)["file_id"][0]
+            body = json.dumps({"ok": True, "result": {"file_id": file_id, "file_path": f"photos/{file_id}.jpg", "file_size": 64}})
+            self._reply(body.encode(), "application/json")
+        else:
+            self._reply(b"JPEG-" + url.path.rsplit("/", 1)[-1].encode() * 8, "image/jpeg")
+
+    def _reply(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def telegram():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _FakeTelegram.calls = []
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+def _photo(name: str) -> dict:
+    sizes = [
+        {"file_id": f"{name}_s", "width": 90, "height": 60},
+        {"file_id": f"{name}_m", "width": 320, "height": 213},
+        {"file_id": f"{name}_x", "width": 1280, "height": 853},
+    ]
+    return {**sizes[-1], "sizes": sizes}
+
+async def _thumb_sha(lead_id: int) -> str:
+    async with AsyncSessionLocal() as session:
+        (attachment,) = await crud.get_attachments(session, lead_id)
+    return attachment.thumb_sha256
+
+def test_thumbnail_hit_then_miss_refetches(telegram, monkeypatch):
+    monkeypatch.setattr(thumbnail_worker, "files", TelegramFiles(settings.bot_token, telegram))
+    with TestClient(app) as client:
+        r = client.post(
+            "/api/bot/leads:batch",
+            json={"leads": [{"lead_type": "client_request", "attachments": [_photo("a")], "idempotency_key": "thumb-test-1"}]},
+            headers={"X-Bot-Token": settings.bot_token},
+        )
+        assert r.status_code == 200
+        lead_id = r.json()[0]["id"]
+
+        assert client.portal.call(thumbnail_worker.run_once) == 1
+        assert any(path.endswith("/photos/a_m.jpg") for path in _FakeTelegram.calls)  # миниатюра — размер >= 320
+        sha = client.portal.call(_thumb_sha, lead_id)
+
+        r = client.get(f"/api/thumbs/{sha}")
+        assert r.status_code == 200
+        assert r.content.startswith(b"JPEG-a_m")
+        assert "immutable" in r.headers["cache-control"]
+
+        # файл вытеснен из кэша этой реплики: 404, база не меняется, воркер докачает
+        os.remove(thumbnail_store.path(sha))
+        assert client.get(f"/api/thumbs/{sha}").status_code == 404
+        assert thumbnail_worker.metrics()["refetch_pending"] == 1
+        assert client.portal.call(_thumb_sha, lead_id) == sha
+
+        assert client.portal.call(thumbnail_worker.run_once) == 1
+        assert thumbnail_worker.metrics()["refetch_pending"] == 0
+        assert client.get(f"/api/thumbs/{sha}").status_code == 200
+
+        assert client.get("/api/thumbs/not-a-sha").status_code == 404
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from typing import Any, Optional
+
+import aiohttp
+
+from .config import settings
+from .metrics import API_LATENCY
+
+class ApiError(RuntimeError):
+    def __init__(self, status: int, text: str):
+        super().__init__(text)
+        self.status = status
+
+class ApiClient:
+    """Один ClientSession на весь бот: пул keep-alive соединений к API."""
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = 8,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.3,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _session_or_start(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def _send(self, method: str, path: str, *, idempotent: bool, **kwargs) -> tuple[int, Any, Optional[str]]:
+        session = await self._session_or_start()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            status = "error"
+            try:
+                async with session.request(method, self.base_url + path, **kwargs) as resp:
+                    status = resp.status
+                    if resp.status == 200:
+                        return resp.status, await resp.json(), resp.headers.get("ETag")
+                    if resp.status == 304:
+                        return resp.status, None, resp.headers.get("ETag")
+                    text = await resp.text()
+                    if resp.status < 500 or not idempotent or attempt >= self.retries:
+                        raise ApiError(resp.status, text)
+            except aiohttp.ClientConnectorError:
+                # соединение не установлено — запрос точно не ушёл, повторять безопасно
+                if attempt >= self.retries:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # запрос мог дойти до API: неидемпотентный не повторяем
+                if not idempotent or attempt >= self.retries:
+                    raise
+            finally:
+                API_LATENCY.observe(time.perf_counter() - start, method, path, status)
+            attempt += 1
+            await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+
+    async def request(self, method: str, path: str, *, idempotent: bool, **kwargs) -> Any:
+        _, body, _ = await self._send(method, path, idempotent=idempotent, **kwargs)
+        return body
+
+    async def get(self, path: str) -> Any:
+        return await self.request("GET", path, idempotent=True)
+
+    async def get_if_changed(self, path: str, etag: Optional[str]) -> tuple[bool, Any, Optional[str]]:
+        # (changed, body, etag); при 304 body = None
+        headers = {"If-None-Match": etag} if etag else None
+        status, body, new_etag = await self._send("GET", path, idempotent=True, headers=headers)
+        return status == 200, body, new_etag or etag
+
+    async def post(self, path: str, payload: dict, headers: Optional[dict] = None, idempotent: bool = False) -> Any:
+        return await self.request("POST", path, json=payload, headers=headers, idempotent=idempotent)
+
+api_client = ApiClient(
+    settings.api_internal_url,
+    pool_size=settings.api_pool_size,
+    timeout=settings.api_timeout,
+    retries=settings.api_retries,
+    backoff=settings.api_retry_backoff,
+)
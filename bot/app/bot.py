@@ -1,15 +1,22 @@
 import asyncio
-import aiohttp
+import uuid
 from aiogram import Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import CommandStart
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, PhotoSize
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
 from .config import settings
 from .keyboards import main_menu
+from .api_client import api_client
+from .content_cache import content_cache
+from .notifier import notifier
+from .fsm_storage import build_storage
+from .outbox import outbox
+from . import metrics
 
-API_URL = settings.api_internal_url.rstrip("/")
 BOT_TOKEN = settings.bot_token
 
 class LeadFSM(StatesGroup):
@@ -29,30 +36,18 @@ class ContractorFSM(StatesGroup):
     experience = State()
     description = State()
 
-async def api_get(path: str):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(API_URL + path) as resp:
-            if resp.status != 200:
-                raise RuntimeError(await resp.text())
-            return await resp.json()
-
-async def api_post_lead(payload: dict):
-    headers = {"X-Bot-Token": BOT_TOKEN, "Content-Type":"application/json"}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(API_URL + "/api/bot/leads", json=payload, headers=headers) as resp:
-            if resp.status != 200:
-                raise RuntimeError(await resp.text())
-            return await resp.json()
-
-def admin_ids():
-    return settings.admin_ids
-
-async def notify_admins(bot: Bot, text: str):
-    for aid in admin_ids():
-        try:
-            await bot.send_message(aid, text)
-        except Exception:
-            pass
+def notify_admins(text: str):
+    # не ждём рассылку: уведомление уходит в очередь notifier
+    notifier.enqueue(text)
+
+async def lead_delivered(bot: Bot, payload: dict, meta: dict, created: dict):
+    # вызывается отправителем outbox, когда заявка уже в базе
+    if payload["lead_type"] == "contractor_application":
+        notify_admins(f"🆕 Новая заявка (подрядчик) #{created['id']}\nГород: {payload['city']}\nСпец: {payload['work_type']}\nТелефон: {payload['phone']}")
+        await bot.send_message(meta["chat_id"], f"📌 Заявка подрядчика зарегистрирована: #{created['id']}")
+    else:
+        notify_admins(f"🆕 Новая заявка (клиент) #{created['id']}\nГород: {payload['city']}\nРаботы: {payload['work_type']}\nТелефон: {payload['phone']}")
+        await bot.send_message(meta["chat_id"], f"📌 Заявка зарегистрирована: #{created['id']}\nСтатус: {created['status']}")
 
 async def start_handler(message: Message):
     await message.answer(
@@ -65,22 +60,21 @@ async def start_handler(message: Message):
         reply_markup=main_menu()
     )
 
+CONTENT_UNAVAILABLE = "Сервис временно недоступен, попробуй чуть позже."
+
 async def docs_handler(cb: CallbackQuery):
-    data = await api_get("/api/content/documents")
-    lines = ["🧾 Документы:"]
-    for d in data:
-        # public link from API
-        url = settings.public_base_url.rstrip("/") + d["url"]
-        lines.append(f"• {d['title']}: {url}")
-    await cb.message.answer("\n".join(lines))
+    try:
+        text = await content_cache.get("documents")
+    except Exception:
+        text = CONTENT_UNAVAILABLE
+    await cb.message.answer(text)
     await cb.answer()
 
 async def faq_handler(cb: CallbackQuery):
-    data = await api_get("/api/content/faq")
-    text = "❓ FAQ (кратко):\n\n"
-    for i, item in enumerate(data[:5], start=1):
-        text += f"{i}) {item['question']}\n"
-    text += "\nПолные ответы — в WebApp."
+    try:
+        text = await content_cache.get("faq")
+    except Exception:
+        text = CONTENT_UNAVAILABLE
     await cb.message.answer(text)
     await cb.answer()
 
@@ -126,12 +120,20 @@ async def lead_desc(message: Message, state: FSMContext):
     await state.set_state(LeadFSM.photos)
     await message.answer("Если есть фото/скрины — отправь их сообщением (можно несколько).\nКогда закончишь — напиши: ГОТОВО")
 
-async def lead_photos(message: Message, state: FSMContext, bot: Bot):
+def photo_attachment(sizes: list[PhotoSize]) -> dict:
+    # все размеры фото: API берёт из них миниатюру, не обращаясь к полному файлу
+    variants = [
+        {"file_id": p.file_id, "file_unique_id": p.file_unique_id, "width": p.width, "height": p.height, "file_size": p.file_size}
+        for p in sizes
+    ]
+    return {**variants[-1], "file_type": "photo", "sizes": variants}
+
+async def lead_photos(message: Message, state: FSMContext):
     data = await state.get_data()
     attachments = data.get("attachments", [])
 
     if message.photo:
-        attachments.append(message.photo[-1].file_id)
+        attachments.append(photo_attachment(message.photo))
         await state.update_data(attachments=attachments)
         await message.answer("Фото добавлено. Ещё? Если всё — напиши: ГОТОВО")
         return
@@ -145,11 +147,11 @@ async def lead_photos(message: Message, state: FSMContext, bot: Bot):
             "work_type": data.get("work_type"),
             "budget": data.get("budget"),
             "description": f"{data.get('description','')}\n\n[Telegram user: @{message.from_user.username or 'no_username'} | id={message.from_user.id}]",
-            "attachments": attachments
+            "attachments": attachments,
+            "idempotency_key": uuid.uuid4().hex,
         }
-        created = await api_post_lead(payload)
-        await message.answer(f"✅ Заявка создана: #{created['id']}\nСтатус: {created['status']}\n\nСпасибо! В демо-версии менеджер не отвечает, но всё уходит в базу.")
-        await notify_admins(bot, f"🆕 Новая заявка (клиент) #{created['id']}\nГород: {payload['city']}\nРаботы: {payload['work_type']}\nТелефон: {payload['phone']}")
+        await outbox.put(payload, {"chat_id": message.chat.id})
+        await message.answer("✅ Заявка принята!\nНомер пришлём следующим сообщением, как только она попадёт в базу.\n\nСпасибо! В демо-версии менеджер не отвечает, но всё уходит в базу.")
         await state.clear()
         return
 
@@ -181,7 +183,7 @@ async def c_exp(message: Message, state: FSMContext):
     await state.set_state(ContractorFSM.description)
     await message.answer("Коротко о вашей бригаде (команда, фото/портфолио ссылкой, условия).")
 
-async def c_desc(message: Message, state: FSMContext, bot: Bot):
+async def c_desc(message: Message, state: FSMContext):
     data = await state.get_data()
     payload = {
         "lead_type": "contractor_application",
@@ -191,11 +193,11 @@ async def c_desc(message: Message, state: FSMContext, bot: Bot):
         "work_type": data.get("specialization"),
         "budget": data.get("experience"),
         "description": f"{message.text.strip()}\n\n[Telegram user: @{message.from_user.username or 'no_username'} | id={message.from_user.id}]",
-        "attachments": []
+        "attachments": [],
+        "idempotency_key": uuid.uuid4().hex,
     }
-    created = await api_post_lead(payload)
-    await message.answer(f"✅ Заявка подрядчика создана: #{created['id']}\nСпасибо! Мы свяжемся (в демо — просто запись в базу).")
-    await notify_admins(bot, f"🆕 Новая заявка (подрядчик) #{created['id']}\nГород: {payload['city']}\nСпец: {payload['work_type']}\nТелефон: {payload['phone']}")
+    await outbox.put(payload, {"chat_id": message.chat.id})
+    await message.answer("✅ Заявка подрядчика принята!\nСпасибо! Мы свяжемся (в демо — просто запись в базу).")
     await state.clear()
 
 def setup(dp: Dispatcher):
@@ -221,10 +223,36 @@ def setup(dp: Dispatcher):
     dp.message.register(c_exp, ContractorFSM.experience)
     dp.message.register(c_desc, ContractorFSM.description)
 
-async def main():
-    bot = Bot(BOT_TOKEN)
-    dp = Dispatcher()
+def create_bot() -> Bot:
+    session = None
+    if settings.telegram_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_url))
+    bot = Bot(BOT_TOKEN, session=session)
+    bot.session.middleware(metrics.TelegramTimingMiddleware())
+    return bot
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=build_storage())
     setup(dp)
+    metrics.instrument(dp)
+    metrics.REGISTRY.add_callback("bot_notifier", notifier.metrics)
+    metrics.REGISTRY.add_callback("bot_outbox", outbox.metrics)
+    outbox.on_delivered = lead_delivered
+    dp.startup.register(api_client.start)
+    dp.startup.register(content_cache.start)
+    dp.startup.register(notifier.start)
+    dp.startup.register(outbox.start)
+    dp.shutdown.register(content_cache.stop)
+    dp.shutdown.register(outbox.stop)
+    dp.shutdown.register(notifier.stop)
+    dp.shutdown.register(api_client.close)
+    return dp
+
+async def main():
+    bot = create_bot()
+    dp = create_dispatcher()
+    dp.startup.register(metrics.metrics_server.start)
+    dp.shutdown.register(metrics.metrics_server.stop)
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
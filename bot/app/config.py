@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from functools import cached_property
+from typing import FrozenSet
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -8,13 +9,61 @@ class Settings(BaseSettings):
     admin_telegram_ids: str = ""
     api_internal_url: str = "http://api:8000"
 
-    @property
-    def admin_ids(self) -> List[int]:
-        ids=[]
+    # HTTP-клиент к API: размер пула, таймаут одного запроса (сек), повторы
+    api_pool_size: int = 8
+    api_timeout: float = 10.0
+    api_retries: int = 2
+    api_retry_backoff: float = 0.3
+
+    # как часто бот перепроверяет FAQ/документы на API (сек)
+    content_refresh_interval: float = 60.0
+
+    # уведомления админам: лимиты Telegram (сообщений/сек) и размер очереди
+    notify_global_rate: float = 25.0
+    notify_per_chat_rate: float = 1.0
+    notify_queue_size: int = 1000
+    notify_max_batch: int = 20
+
+    # FSM: пусто — в памяти; sqlite+aiosqlite:///..., postgresql+asyncpg://..., redis://...
+    fsm_storage_url: str = ""
+    fsm_state_ttl: int = 3 * 86400
+    # 0 — запись сразу в базу (общая FSM для нескольких процессов бота); > 0 — буфер
+    # в памяти на столько секунд, только при одном процессе
+    fsm_flush_interval: float = 0.0
+    fsm_cleanup_interval: float = 600.0
+
+    # локальный журнал заявок: пишется до ответа пользователю, в API уходит фоном пачками
+    outbox_path: str = "bot_outbox.sqlite3"
+    outbox_batch_size: int = 50
+    outbox_poll_interval: float = 2.0
+    outbox_max_backoff: float = 300.0
+
+    # свой адрес Bot API (локальный сервер или заглушка для тестов); пусто — api.telegram.org
+    telegram_api_url: str = ""
+
+    # webhook-режим: публичный URL (пусто — setWebhook не вызываем), секрет, очередь и воркеры
+    webhook_url: str = ""
+    webhook_path: str = "/tg/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_workers: int = 8
+    webhook_queue_size: int = 1000
+
+    # /metrics (Prometheus): в webhook-режиме на том же порту, в polling — отдельный сервер на METRICS_PORT (0 — выкл.);
+    # с METRICS_TOKEN нужен "Authorization: Bearer <токен>"; PROFILER_ENABLED=1 включает /debug/profile
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int = 0
+    metrics_token: str = ""
+    profiler_enabled: bool = False
+
+    @cached_property
+    def admin_ids(self) -> FrozenSet[int]:
+        ids=set()
         for p in (self.admin_telegram_ids or "").split(","):
             p=p.strip()
             if p.isdigit():
-                ids.append(int(p))
-        return ids
+                ids.add(int(p))
+        return frozenset(ids)
 
 settings = Settings()
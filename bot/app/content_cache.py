@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from .api_client import ApiClient, api_client
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+def render_documents(items: list[dict]) -> str:
+    base = settings.public_base_url.rstrip("/")
+    lines = ["🧾 Документы:"]
+    for d in items:
+        # public link from API
+        lines.append(f"• {d['title']}: {base}{d['url']}")
+    return "\n".join(lines)
+
+def render_faq(items: list[dict]) -> str:
+    lines = ["❓ FAQ (кратко):", ""]
+    for i, item in enumerate(items[:5], start=1):
+        lines.append(f"{i}) {item['question']}")
+    lines.append("")
+    lines.append("Полные ответы — в WebApp.")
+    return "\n".join(lines)
+
+SOURCES: dict[str, tuple[str, Callable[[list[dict]], str]]] = {
+    "documents": ("/api/content/documents", render_documents),
+    "faq": ("/api/content/faq", render_faq),
+}
+
+class ContentCache:
+    """Готовые тексты FAQ/документов. Обновляются в фоне по ETag;
+    если API лежит — отдаём последнюю удачную версию."""
+
+    def __init__(self, client: ApiClient, interval: float):
+        self.client = client
+        self.interval = interval
+        self._texts: dict[str, str] = {}
+        self._etags: dict[str, Optional[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self, name: str) -> str:
+        path, render = SOURCES[name]
+        changed, items, etag = await self.client.get_if_changed(path, self._etags.get(name) if name in self._texts else None)
+        if changed:
+            self._texts[name] = render(items)
+        self._etags[name] = etag
+        return self._texts[name]
+
+    async def refresh_all(self) -> None:
+        for name in SOURCES:
+            try:
+                await self.refresh(name)
+            except Exception:
+                log.warning("content refresh failed for %s, keeping cached copy", name, exc_info=True)
+
+    async def get(self, name: str) -> str:
+        text = self._texts.get(name)
+        if text is not None:
+            return text
+        # холодный старт: один синхронный запрос, дальше — только фон
+        return await self.refresh(name)
+
+    async def _loop(self) -> None:
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+content_cache = ContentCache(api_client, settings.content_refresh_interval)
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+fsm_states = Table(
+    "bot_fsm_states",
+    metadata,
+    Column("key", String(255), primary_key=True),
+    Column("state", String(255), nullable=True),
+    Column("data", Text, nullable=False, default="{}"),
+    Column("updated_at", Float, nullable=False, index=True),
+)
+
+_UNSET = object()
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+class SqlStorage(BaseStorage):
+    """FSM в таблице bot_fsm_states (SQLite или Postgres).
+
+    По умолчанию (flush_interval=0) каждая запись доходит до базы раньше, чем
+    set_state/set_data вернут управление, — реплики бота видят одно состояние.
+    flush_interval > 0 — явное согласие на буфер: записи копятся в памяти и
+    сбрасываются одной транзакцией раз в flush_interval секунд, чтения сначала
+    смотрят в буфер. Буфер виден только своему процессу, поэтому так можно
+    только с одним процессом бота. Брошенные диалоги удаляются по ttl.
+
+    Сбросы идут строго по одному (_flush_lock), так что в базу они
+    попадают в том же порядке, в каком были сделаны записи.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        ttl: float = 3 * 86400,
+        flush_interval: float = 0.0,
+        cleanup_interval: float = 600.0,
+    ):
+        self.engine = engine
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._inflight: dict[str, dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._init_lock = asyncio.Lock()
+        self._ready = False
+        self._flusher: Optional[asyncio.Task] = None
+        self._cleaner: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "SqlStorage":
+        return cls(create_async_engine(url), **kwargs)
+
+    async def _ensure_ready(self) -> None:
+        if self._ready:
+            return
+        async with self._init_lock:
+            if self._ready:
+                return
+            async with self.engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+            self._ready = True
+        if self.flush_interval > 0 and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if self.ttl > 0 and self._cleaner is None:
+            self._cleaner = asyncio.create_task(self._cleanup_loop())
+
+    def _upsert(self, columns: tuple[str, ...]):
+        insert = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        stmt = insert(fsm_states)
+        return stmt.on_conflict_do_update(
+            index_elements=[fsm_states.c.key],
+            set_={c: stmt.excluded[c] for c in columns + ("updated_at",)},
+        )
+
+    async def flush(self) -> None:
+        # параллельный сброс ждёт предыдущий: иначе _inflight затирается, а две
+        # транзакции по одному ключу могут закоммититься в обратном порядке
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self._inflight = pending
+        # группируем по набору изменённых колонок: на каждую группу один executemany
+        groups: dict[tuple[str, ...], list[dict]] = {}
+        now = time.time()
+        for key, changes in pending.items():
+            cols = tuple(sorted(changes))
+            groups.setdefault(cols, []).append({
+                "key": key,
+                "state": changes.get("state"),
+                "data": changes.get("data", "{}"),
+                "updated_at": now,
+            })
+        try:
+            async with self.engine.begin() as conn:
+                for cols, rows in groups.items():
+                    await conn.execute(self._upsert(cols), rows)
+        except Exception:
+            # вернуть в буфер то, что не успели перезаписать новые изменения
+            async with self._lock:
+                for key, changes in pending.items():
+                    self._pending[key] = {**changes, **self._pending.get(key, {})}
+            raise
+        finally:
+            self._inflight = {}
+
+    async def _write(self, key: StorageKey, column: str, value: Any) -> None:
+        await self._ensure_ready()
+        async with self._lock:
+            self._pending.setdefault(self.key_builder.build(key), {})[column] = value
+        if self.flush_interval <= 0:
+            await self.flush()
+
+    async def _read(self, key: StorageKey, column: str) -> Any:
+        await self._ensure_ready()
+        skey = self.key_builder.build(key)
+        # пока изменения не в базе, читаем их из буфера
+        for buffer in (self._pending, self._inflight):
+            value = buffer.get(skey, {}).get(column, _UNSET)
+            if value is not _UNSET:
+                return value
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(fsm_states.c[column], fsm_states.c.updated_at).where(fsm_states.c.key == skey)
+            )).first()
+        if row is None or (self.ttl > 0 and row.updated_at < time.time() - self.ttl):
+            return None
+        return row[0]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(key, "state", _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._read(key, "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(key, "data", json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        raw = await self._read(key, "data")
+        return json.loads(raw) if raw else {}
+
+    async def cleanup(self) -> int:
+        async with self.engine.begin() as conn:
+            res = await conn.execute(delete(fsm_states).where(fsm_states.c.updated_at < time.time() - self.ttl))
+        return res.rowcount or 0
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.warning("FSM flush failed, will retry", exc_info=True)
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                removed = await self.cleanup()
+                if removed:
+                    log.info("removed %s abandoned FSM dialogs", removed)
+            except Exception:
+                log.warning("FSM cleanup failed", exc_info=True)
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def close(self) -> None:
+        for task in (self._flusher, self._cleaner):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._flusher = self._cleaner = None
+        if self._ready:
+            await self.flush()
+        await self.engine.dispose()
+
+def build_storage(url: str = "") -> BaseStorage:
+    url = url or settings.fsm_storage_url
+    if not url or url.startswith("memory"):
+        return MemoryStorage()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("FSM_STORAGE_URL is redis:// but the 'redis' package is not installed") from e
+        ttl = int(settings.fsm_state_ttl) or None
+        return RedisStorage.from_url(url, state_ttl=ttl, data_ttl=ttl)
+    return SqlStorage.from_url(
+        url,
+        ttl=settings.fsm_state_ttl,
+        flush_interval=settings.fsm_flush_interval,
+        cleanup_interval=settings.fsm_cleanup_interval,
+    )
@@ -0,0 +1,138 @@
+import hmac
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+from .config import settings
+from .metrics_core import Registry, SamplingProfiler
+
+# Метрики бота в формате Prometheus: время обработчиков и шагов FSM, запросы
+# к API и к Telegram. Отдаются на /metrics — в webhook-режиме тем же aiohttp-
+# приложением, в polling-режиме отдельным сервером на METRICS_PORT.
+
+REGISTRY = Registry()
+
+UPDATE_LATENCY = REGISTRY.histogram(
+    "bot_update_duration_seconds", "Update processing time (filters, storage, handler)", ("update_type",))
+HANDLER_LATENCY = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Handler latency", ("handler", "status"))
+FSM_STEP_LATENCY = REGISTRY.histogram(
+    "bot_fsm_step_duration_seconds", "Handler latency by FSM state the update arrived in", ("state",))
+API_LATENCY = REGISTRY.histogram(
+    "bot_api_request_duration_seconds", "Requests to the backend API (per attempt)", ("method", "path", "status"))
+TELEGRAM_LATENCY = REGISTRY.histogram(
+    "bot_telegram_request_duration_seconds", "Bot API calls", ("method", "status"))
+
+# --- aiogram ---
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.update: полное время апдейта, включая фильтры и FSM-хранилище."""
+
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict) -> Any:
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_LATENCY.observe(time.perf_counter() - start, getattr(event, "event_type", None) or "unknown")
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Внутренний middleware (вызывается, когда обработчик уже выбран): время
+    обработчика по имени и — если пользователь в диалоге — по состоянию FSM."""
+
+    async def __call__(self, handler: Callable[[Any, dict], Awaitable[Any]], event: Any, data: dict) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        state = data.get("raw_state")
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            HANDLER_LATENCY.observe(elapsed, name, status)
+            if state:
+                FSM_STEP_LATENCY.observe(elapsed, state)
+
+class TelegramTimingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot: время каждого вызова Bot API (sendMessage, answerCallbackQuery, ...)."""
+
+    async def __call__(self, make_request, bot, method):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await make_request(bot, method)
+            status = "ok"
+            return result
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - start, getattr(method, "__api_method__", type(method).__name__), status)
+
+def instrument(dp) -> None:
+    dp.update.outer_middleware(UpdateTimingMiddleware())
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(HandlerTimingMiddleware())
+
+# --- профайлер ---
+
+profiler = SamplingProfiler()
+
+# --- HTTP ---
+
+def _authorized(request: web.Request) -> bool:
+    if not settings.metrics_token:
+        return True
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.metrics_token}")
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    if not _authorized(request):
+        return web.Response(status=401, text="bad metrics token")
+    body = await REGISTRY.render()
+    return web.Response(body=body.encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def profile_handler(request: web.Request) -> web.Response:
+    if not settings.profiler_enabled:
+        raise web.HTTPNotFound()
+    if not _authorized(request):
+        return web.Response(status=401, text="bad metrics token")
+    try:
+        seconds = float(request.query.get("seconds", 30))
+        hz = float(request.query.get("hz", 100))
+    except ValueError:
+        return web.Response(status=400, text="seconds and hz must be numbers")
+    try:
+        body = await profiler.profile(seconds, hz)
+    except RuntimeError as e:
+        return web.Response(status=409, text=str(e))
+    return web.Response(text=body)
+
+def add_routes(app: web.Application) -> None:
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/debug/profile", profile_handler)
+
+class MetricsServer:
+    """Отдельный HTTP-сервер для /metrics в polling-режиме (там своего сервера нет)."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        if self._runner is not None or not self.port:
+            return
+        app = web.Application()
+        add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics_server = MetricsServer(settings.metrics_host, settings.metrics_port)
@@ -0,0 +1,156 @@
+import asyncio
+import bisect
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from typing import Callable
+
+# Примитивы метрик (формат Prometheus) и сэмплирующий профайлер — общие для API
+# и бота. Бот и API собираются каждый из своей папки (контекст сборки в
+# docker-compose, Root Directory на Railway), поэтому файл лежит в обоих пакетах:
+# backend/app/metrics_core.py и bot/app/metrics_core.py должны совпадать байт в
+# байт — это проверяет backend/tests/test_metrics_core.py. Правьте оба сразу.
+# Здесь только стандартная библиотека; экземпляры и метрики — в metrics.py.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (не накопленные) + переполнение, сумма, количество]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        item = self._values.get(labels)
+        if item is None:
+            item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        item[0][bisect.bisect_left(self.buckets, value)] += 1
+        item[1] += value
+        item[2] += 1
+
+    def render(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                acc += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+        # prefix -> функция, возвращающая dict чисел (в т.ч. async): metrics() воркеров и очередей
+        self._callbacks: dict[str, Callable] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def add_callback(self, prefix: str, fn: Callable) -> None:
+        self._callbacks[prefix] = fn
+
+    async def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for prefix, fn in self._callbacks.items():
+            values = fn()
+            if inspect.isawaitable(values):
+                values = await values
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {_num(value)}")
+        return "\n".join(lines) + "\n"
+
+# --- профайлер ---
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(";", ":")
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер для продакшена: отдельный поток hz раз в секунду
+    снимает стек потока event loop через sys._current_frames(). Накладные расходы
+    только на время снятия профиля. Результат — свёрнутые стеки («a;b;c 42»),
+    их понимают flamegraph.pl, speedscope и inferno."""
+
+    MAX_SECONDS = 300.0
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    def _sample(self, thread_id: int, seconds: float, hz: float) -> _Counter:
+        stacks: _Counter = _Counter()
+        interval = 1.0 / hz
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                stacks[";".join(reversed(names))] += 1
+            time.sleep(interval)
+        return stacks
+
+    async def profile(self, seconds: float = 30.0, hz: float = 100.0) -> str:
+        if self._lock.locked():
+            raise RuntimeError("profile is already running")
+        seconds = max(0.1, min(seconds, self.MAX_SECONDS))
+        hz = max(1.0, min(hz, 1000.0))
+        async with self._lock:
+            stacks = await asyncio.to_thread(self._sample, threading.get_ident(), seconds, hz)
+        return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+MAX_MESSAGE_LEN = 4096
+MAX_RETRY_AFTER_ATTEMPTS = 3
+
+class RateLimiter:
+    """Не чаще rate вызовов в секунду (равномерно, без всплесков)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            delay = self._next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(loop.time(), self._next) + self.interval
+
+    def pause(self, seconds: float) -> None:
+        # RetryAfter от Telegram: сдвигаем следующее окно
+        loop = asyncio.get_running_loop()
+        self._next = max(self._next, loop.time() + seconds)
+
+def digest(texts: list[str]) -> list[str]:
+    if len(texts) == 1:
+        return texts
+    messages = []
+    current = f"🆕 Новых заявок: {len(texts)}"
+    for text in texts:
+        if len(current) + 2 + len(text) > MAX_MESSAGE_LEN:
+            messages.append(current)
+            current = text[:MAX_MESSAGE_LEN]
+        else:
+            current += "\n\n" + text
+    messages.append(current)
+    return messages
+
+class AdminNotifier:
+    """Очередь уведомлений админам. Хендлеры только кладут текст в очередь,
+    рассылкой занимается фоновый воркер с учётом лимитов Telegram."""
+
+    def __init__(
+        self,
+        admin_ids: Iterable[int],
+        global_rate: float = 25.0,
+        per_chat_rate: float = 1.0,
+        queue_size: int = 1000,
+        max_batch: int = 20,
+    ):
+        self.admin_ids = frozenset(admin_ids)
+        self.max_batch = max_batch
+        self.per_chat_rate = per_chat_rate
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self._global = RateLimiter(global_rate)
+        self._per_chat: dict[int, RateLimiter] = {}
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batched = 0
+
+    def enqueue(self, text: str) -> None:
+        if not self.admin_ids:
+            return
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            log.warning("admin notification queue is full, dropping message")
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "batched": self.batched,
+        }
+
+    def _chat_limiter(self, chat_id: int) -> RateLimiter:
+        limiter = self._per_chat.get(chat_id)
+        if limiter is None:
+            limiter = self._per_chat[chat_id] = RateLimiter(self.per_chat_rate)
+        return limiter
+
+    async def _send(self, chat_id: int, text: str) -> None:
+        chat = self._chat_limiter(chat_id)
+        for _ in range(MAX_RETRY_AFTER_ATTEMPTS):
+            await chat.wait()
+            await self._global.wait()
+            try:
+                await self._bot.send_message(chat_id, text)
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                log.info("flood limit for chat %s, retry after %ss", chat_id, e.retry_after)
+                chat.pause(e.retry_after)
+                self._global.pause(e.retry_after)
+            except Exception:
+                log.warning("failed to notify admin %s", chat_id, exc_info=True)
+                break
+        self.failed += 1
+
+    def _take_batch(self, first: str) -> list[str]:
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _worker(self) -> None:
+        while True:
+            batch = self._take_batch(await self._queue.get())
+            if len(batch) > 1:
+                self.batched += len(batch)
+            for text in digest(batch):
+                await asyncio.gather(*(self._send(aid, text) for aid in self.admin_ids))
+            for _ in batch:
+                self._queue.task_done()
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._worker())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+notifier = AdminNotifier(
+    settings.admin_ids,
+    global_rate=settings.notify_global_rate,
+    per_chat_rate=settings.notify_per_chat_rate,
+    queue_size=settings.notify_queue_size,
+    max_batch=settings.notify_max_batch,
+)
@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import Awaitable, Callable, Optional
+
+from aiogram import Bot
+from sqlalchemy import Boolean, Column, Float, Integer, MetaData, String, Table, Text, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from .api_client import ApiClient, ApiError, api_client
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+outbox_table = Table(
+    "lead_outbox",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("idempotency_key", String(64), nullable=False, unique=True),
+    Column("payload", Text, nullable=False),
+    Column("meta", Text, nullable=False, default="{}"),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("next_attempt_at", Float, nullable=False, default=0.0, index=True),
+    Column("dead", Boolean, nullable=False, default=False),
+)
+
+# API отверг саму заявку — повтор ничего не изменит (409 — её ключ занят другой
+# заявкой). Остальные ошибки (401 при неверном токене, 404 до выката нового API,
+# 408, 429, 5xx) — повторяем с бэкоффом
+REJECTED_STATUSES = (400, 409, 422)
+
+DeliveredHandler = Callable[[Bot, dict, dict, dict], Awaitable[None]]
+
+class LeadOutbox:
+    """Локальный журнал заявок (SQLite). Хендлер записывает заявку сюда и сразу
+    отвечает пользователю; фоновый отправитель пачками доставляет её в API.
+    Ключ идемпотентности записывается вместе с заявкой, поэтому повторы безопасны."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        client: ApiClient,
+        batch_size: int = 50,
+        poll_interval: float = 2.0,
+        max_backoff: float = 300.0,
+    ):
+        self.engine = engine
+        self.client = client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.on_delivered: Optional[DeliveredHandler] = None
+        self._bot: Optional[Bot] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._ready = False
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead = 0
+
+    async def _ensure_ready(self) -> None:
+        if not self._ready:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+            self._ready = True
+
+    async def put(self, payload: dict, meta: dict) -> None:
+        await self._ensure_ready()
+        async with self.engine.begin() as conn:
+            await conn.execute(outbox_table.insert().values(
+                idempotency_key=payload["idempotency_key"],
+                payload=json.dumps(payload, ensure_ascii=False),
+                meta=json.dumps(meta, ensure_ascii=False),
+                attempts=0,
+                next_attempt_at=0.0,
+                dead=False,
+            ))
+        self._wakeup.set()
+
+    async def depth(self) -> int:
+        await self._ensure_ready()
+        async with self.engine.connect() as conn:
+            return await conn.scalar(
+                select(func.count()).select_from(outbox_table).where(outbox_table.c.dead.is_(False))
+            )
+
+    async def metrics(self) -> dict:
+        return {
+            "depth": await self.depth(),
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "dead": self.dead,
+        }
+
+    async def _due(self) -> list:
+        async with self.engine.connect() as conn:
+            res = await conn.execute(
+                select(outbox_table)
+                .where(outbox_table.c.dead.is_(False), outbox_table.c.next_attempt_at <= time.time())
+                .order_by(outbox_table.c.id)
+                .limit(self.batch_size)
+            )
+            return list(res)
+
+    async def _post(self, rows: list) -> list[dict]:
+        body = {"leads": [json.loads(r.payload) for r in rows]}
+        headers = {"X-Bot-Token": settings.bot_token}
+        return await self.client.post("/api/bot/leads:batch", body, headers=headers, idempotent=True)
+
+    async def _delivered(self, rows: list, created: list[dict]) -> None:
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(outbox_table).where(outbox_table.c.id.in_([r.id for r in rows])))
+        self.delivered += len(rows)
+        if self.on_delivered is None:
+            return
+        for row, lead in zip(rows, created):
+            try:
+                await self.on_delivered(self._bot, json.loads(row.payload), json.loads(row.meta), lead)
+            except Exception:
+                log.warning("post-delivery hook failed for lead %s", lead.get("id"), exc_info=True)
+
+    async def _postpone(self, rows: list) -> None:
+        self.failed_attempts += len(rows)
+        now = time.time()
+        async with self.engine.begin() as conn:
+            for r in rows:
+                delay = min(self.max_backoff, self.poll_interval * 2 ** r.attempts)
+                await conn.execute(
+                    update(outbox_table)
+                    .where(outbox_table.c.id == r.id)
+                    .values(attempts=r.attempts + 1, next_attempt_at=now + delay)
+                )
+
+    async def _bury(self, row, error: ApiError) -> None:
+        # API отверг заявку (400/409/422) — повторять бессмысленно, оставляем в журнале для разбора
+        self.dead += 1
+        log.error("lead %s rejected by API (%s): %s", row.idempotency_key, error.status, error)
+        async with self.engine.begin() as conn:
+            await conn.execute(update(outbox_table).where(outbox_table.c.id == row.id).values(dead=True))
+
+    async def requeue_dead(self) -> int:
+        """Вернуть отвергнутые заявки в очередь (после исправления API или данных)."""
+        await self._ensure_ready()
+        async with self.engine.begin() as conn:
+            res = await conn.execute(
+                update(outbox_table)
+                .where(outbox_table.c.dead.is_(True))
+                .values(dead=False, attempts=0, next_attempt_at=0.0)
+            )
+        self._wakeup.set()
+        return res.rowcount or 0
+
+    async def drain_once(self) -> int:
+        await self._ensure_ready()
+        rows = await self._due()
+        if not rows:
+            return 0
+        try:
+            created = await self._post(rows)
+        except ApiError as e:
+            if e.status not in REJECTED_STATUSES:
+                log.warning("outbox delivery failed (%s), will retry: %s", e.status, e)
+                await self._postpone(rows)
+                return 0
+            if len(rows) == 1:
+                await self._bury(rows[0], e)
+                return 0
+            # одна плохая заявка не должна держать остальные: шлём по одной
+            sent = 0
+            for row in rows:
+                try:
+                    await self._delivered([row], await self._post([row]))
+                    sent += 1
+                except ApiError as item_error:
+                    if item_error.status not in REJECTED_STATUSES:
+                        await self._postpone([row])
+                    else:
+                        await self._bury(row, item_error)
+                except Exception:
+                    await self._postpone([row])
+            return sent
+        except Exception:
+            log.warning("outbox delivery failed, will retry", exc_info=True)
+            await self._postpone(rows)
+            return 0
+        await self._delivered(rows, created)
+        return len(rows)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                sent = await self.drain_once()
+            except Exception:
+                log.exception("outbox sender crashed, restarting")
+                sent = 0
+            if sent >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, bot: Bot) -> None:
+        self._bot = bot
+        await self._ensure_ready()
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.engine.dispose()
+
+outbox = LeadOutbox(
+    create_async_engine(f"sqlite+aiosqlite:///{settings.outbox_path}"),
+    api_client,
+    batch_size=settings.outbox_batch_size,
+    poll_interval=settings.outbox_poll_interval,
+    max_backoff=settings.outbox_max_backoff,
+)
+
+async def _main(args: argparse.Namespace) -> int:
+    try:
+        if args.requeue_dead:
+            print(f"requeued {await outbox.requeue_dead()} rejected leads")
+        print(f"pending: {await outbox.depth()}")
+        return 0
+    finally:
+        await outbox.engine.dispose()
+
+if __name__ == "__main__":
+    # отправитель работает в процессе бота; команда только правит журнал
+    parser = argparse.ArgumentParser(prog="python -m app.outbox")
+    parser.add_argument("--requeue-dead", action="store_true", help="retry leads the API rejected")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,201 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from .bot import create_bot, create_dispatcher
+from .config import settings
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def chat_key(update: dict) -> int:
+    """Ключ шардирования: апдейты одного чата всегда попадают к одному воркеру."""
+    for name, payload in update.items():
+        if name == "update_id" or not isinstance(payload, dict):
+            continue
+        for path in (("chat",), ("message", "chat"), ("from",), ("user",)):
+            node: Any = payload
+            for part in path:
+                node = node.get(part) if isinstance(node, dict) else None
+            if isinstance(node, dict) and "id" in node:
+                return int(node["id"])
+    return int(update.get("update_id", 0))
+
+class UpdateWorkerPool:
+    """N воркеров, у каждого своя ограниченная очередь. HTTP-обработчик только
+    кладёт апдейт в очередь и сразу отвечает Telegram; порядок внутри чата
+    сохраняется, разные чаты обрабатываются параллельно."""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = 8, queue_size: int = 1000):
+        self.dp = dp
+        self.bot = bot
+        per_worker = max(1, queue_size // max(1, workers))
+        self._queues: list[asyncio.Queue[dict]] = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._tasks: list[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, update: dict) -> bool:
+        queue = self._queues[chat_key(update) % len(self._queues)]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": sum(q.qsize() for q in self._queues),
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            data = await queue.get()
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                log.exception("failed to process update %s", data.get("update_id"))
+            finally:
+                queue.task_done()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await self.dp.emit_startup(bot=self.bot, dispatcher=self.dp, bots=[self.bot])
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning("webhook queue not drained in %ss, dropping %s updates", drain_timeout, self.metrics()["queue_depth"])
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.dp.emit_shutdown(bot=self.bot, dispatcher=self.dp, bots=[self.bot])
+        await self.bot.session.close()
+
+def create_pool() -> UpdateWorkerPool:
+    return UpdateWorkerPool(
+        create_dispatcher(),
+        create_bot(),
+        workers=settings.webhook_workers,
+        queue_size=settings.webhook_queue_size,
+    )
+
+def _secret_ok(received: Optional[str]) -> bool:
+    if not settings.webhook_secret:
+        return True
+    return received is not None and hmac.compare_digest(received, settings.webhook_secret)
+
+def _accept(pool: UpdateWorkerPool, headers_secret: Optional[str], body: bytes) -> tuple[int, bytes]:
+    if not _secret_ok(headers_secret):
+        return 401, b"bad secret"
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return 400, b"bad json"
+    if not isinstance(data, dict):
+        return 400, b"bad update"
+    # 503 — Telegram повторит доставку позже
+    return (200, b"ok") if pool.submit(data) else (503, b"busy")
+
+class WebhookASGI:
+    """ASGI-приложение для app.mount(...) в FastAPI. Воркеры поднимаются при
+    первом запросе (смонтированные приложения не получают lifespan),
+    остановка — через shutdown()."""
+
+    def __init__(self):
+        self.pool: Optional[UpdateWorkerPool] = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_pool(self) -> UpdateWorkerPool:
+        if self.pool is None:
+            async with self._lock:
+                if self.pool is None:
+                    pool = create_pool()
+                    await pool.start()
+                    self.pool = pool
+        return self.pool
+
+    async def shutdown(self) -> None:
+        if self.pool is not None:
+            await self.pool.stop()
+            self.pool = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await self.shutdown()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        if scope["method"] != "POST":
+            status, body = 405, b"method not allowed"
+        else:
+            chunks = []
+            more = True
+            while more:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                more = message.get("more_body", False)
+            headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+            pool = await self._ensure_pool()
+            status, body = _accept(pool, headers.get(SECRET_HEADER.lower()), b"".join(chunks))
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": body})
+
+asgi_app = WebhookASGI()
+
+async def _handle(request: web.Request) -> web.Response:
+    status, body = _accept(request.app["pool"], request.headers.get(SECRET_HEADER), await request.read())
+    return web.Response(status=status, body=body)
+
+async def _on_startup(app: web.Application) -> None:
+    pool: UpdateWorkerPool = app["pool"]
+    await pool.start()
+    if settings.webhook_url:
+        await pool.bot.set_webhook(
+            settings.webhook_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret or None,
+        )
+
+async def _on_shutdown(app: web.Application) -> None:
+    await app["pool"].stop()
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app["pool"] = create_pool()
+    app.router.add_post(settings.webhook_path, _handle)
+    metrics.add_routes(app)
+    metrics.REGISTRY.add_callback("bot_webhook", app["pool"].metrics)
+    app.on_startup.append(_on_startup)
+    app.on_shutdown.append(_on_shutdown)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=settings.webhook_host, port=settings.webhook_port)
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# настройки читаются при импорте app.config — до него
+_tmp = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("API_INTERNAL_URL", "http://127.0.0.1:9")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(_tmp, "outbox.sqlite3"))
+os.environ.setdefault("FSM_STORAGE_URL", "")
+os.environ.setdefault("WEBHOOK_SECRET", "test-secret")
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import webhook
+from app.config import settings
+
+UPDATES = Path(__file__).parent / "updates"
+
+async def _fake_telegram(sent: list) -> TestServer:
+    """Заглушка Bot API: запоминает вызовы и отвечает правдоподобным Message."""
+    async def method(request: web.Request) -> web.Response:
+        data = dict(await request.post())
+        sent.append((request.match_info["method"], data))
+        chat = {"id": int(data.get("chat_id", 0)), "type": "private"}
+        return web.json_response({"ok": True, "result": {"message_id": 1, "date": int(time.time()), "chat": chat}})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", method)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+async def _post_recorded_update(monkeypatch) -> None:
+    sent: list = []
+    telegram = await _fake_telegram(sent)
+    monkeypatch.setattr(settings, "telegram_api_url", str(telegram.make_url("")).rstrip("/"))
+    update = json.loads((UPDATES / "start.json").read_text())
+
+    client = TestClient(TestServer(webhook.create_app()))
+    await client.start_server()
+    try:
+        r = await client.post(settings.webhook_path, json=update,
+                              headers={webhook.SECRET_HEADER: settings.webhook_secret})
+        assert r.status == 200
+        assert await r.text() == "ok"
+
+        r = await client.post(settings.webhook_path, json=update, headers={webhook.SECRET_HEADER: "wrong"})
+        assert r.status == 401
+
+        # ответ Telegram уходит сразу, обработка — в воркере: ждём приветствие на /start
+        for _ in range(100):
+            if any(m == "sendMessage" for m, _ in sent):
+                break
+            await asyncio.sleep(0.05)
+        method, data = next((m, d) for m, d in sent if m == "sendMessage")
+        assert data["chat_id"] == str(update["message"]["chat"]["id"])
+        assert client.server.app["pool"].metrics()["processed"] == 1
+    finally:
+        await client.close()
+        await telegram.close()
+
+def test_recorded_update_is_acknowledged_and_handled(monkeypatch):
+    asyncio.run(_post_recorded_update(monkeypatch))